@@ -0,0 +1,6 @@
+from .lru import LRUCache
+from .versions import table_versions, mark_written
+from .reference import ReferenceCache, city_cache, forwarder_cache, special_option_cache
+from .statements import StatementCache
+from .documents import DocumentCache, document_cache
+from .results import ResultCacheBackend, LocalResultCacheBackend, QueryResultCache, result_cache
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import anyio
+
+from app.config import settings
+
+
+# Rendered documents keyed by everything they are built from. A byte-bounded in-memory tier sits
+# in front of a byte-bounded directory, both evict least recently used entries. File IO runs in
+# worker threads, the index itself is only touched from the event loop.
+class DocumentCache:
+    def __init__(self, directory: str, disk_size: int, memory_size: int):
+        self.directory = directory
+        self.disk_size = disk_size
+        self.memory_size = memory_size
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_used = 0
+        self._disk: OrderedDict[str, int] | None = None
+        self._disk_used = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def _scan(self) -> OrderedDict[str, int]:
+        os.makedirs(self.directory, exist_ok=True)
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith('.pdf')),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        return OrderedDict((entry.name.removesuffix('.pdf'), entry.stat().st_size) for entry in entries)
+
+    def _read(self, key: str) -> bytes | None:
+        try:
+            with open(path := self._path(key), 'rb') as file:
+                content = file.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return content
+
+    def _write(self, key: str, content: bytes):
+        # written aside and renamed, so readers of other processes never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, self._path(key))
+
+    def _remove(self, keys: list[str]):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def _disk_index(self) -> OrderedDict[str, int]:
+        if self._disk is None:
+            self._disk = await anyio.to_thread.run_sync(self._scan)
+            self._disk_used = sum(self._disk.values())
+        return self._disk
+
+    def _remember(self, key: str, content: bytes):
+        if len(content) > self.memory_size:
+            return
+
+        if (old := self._memory.pop(key, None)) is not None:
+            self._memory_used -= len(old)
+        self._memory[key] = content
+        self._memory_used += len(content)
+
+        while self._memory_used > self.memory_size:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    async def get(self, key: str) -> bytes | None:
+        if (content := self._memory.get(key)) is not None:
+            self._memory.move_to_end(key)
+            return content
+
+        disk = await self._disk_index()
+        if (content := await anyio.to_thread.run_sync(self._read, key)) is None:
+            if (size := disk.pop(key, None)) is not None:
+                self._disk_used -= size
+            return None
+
+        if key not in disk:
+            disk[key] = len(content)
+            self._disk_used += len(content)
+        disk.move_to_end(key)
+
+        self._remember(key, content)
+        return content
+
+    async def set(self, key: str, content: bytes):
+        self._remember(key, content)
+
+        disk = await self._disk_index()
+        await anyio.to_thread.run_sync(self._write, key, content)
+
+        self._disk_used += len(content) - disk.pop(key, 0)
+        disk[key] = len(content)
+
+        evicted = []
+        while self._disk_used > self.disk_size and len(disk) > 1:
+            evicted_key, size = disk.popitem(last=False)
+            self._disk_used -= size
+            evicted.append(evicted_key)
+        if evicted:
+            await anyio.to_thread.run_sync(self._remove, evicted)
+
+
+document_cache = DocumentCache(settings.PDF_CACHE_DIR, settings.PDF_CACHE_DISK_SIZE, settings.PDF_CACHE_MEMORY_SIZE)
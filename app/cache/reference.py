@@ -0,0 +1,77 @@
+from typing import Any, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, make_transient_to_detached
+
+from app.config import settings
+from app.database import Base, CityORM, ForwarderORM, SpecialOptionORM
+from app.database.core import upsert
+from .lru import LRUCache
+from .versions import table_versions
+
+
+# Rows of rarely changing lookup tables, kept as plain column dicts. The whole table cache is
+# dropped as soon as a session of this process commits a write to that table.
+class ReferenceCache:
+    def __init__(self, model: type[Base], key: InstrumentedAttribute, maxsize: int, ttl: float):
+        self.model = model
+        self.key = key
+        self._cache = LRUCache(maxsize, ttl)
+        self._version = table_versions.get(model)
+
+    def _valid_cache(self) -> LRUCache:
+        if (version := table_versions.get(self.model)) != self._version:
+            self._cache.clear()
+            self._version = version
+        return self._cache
+
+    def invalidate(self):
+        self._cache.clear()
+
+    async def get_many(self, keys: Iterable[Any], async_session: AsyncSession) -> dict[Any, dict[str, Any]]:
+        cache, version = self._valid_cache(), self._version
+        keys = set(keys)
+        found = {key: row for key in keys if (row := cache.get(key)) is not None}
+
+        if missing := keys - found.keys():
+            stmt = select(*self.model.__table__.c).filter(self.key.in_(missing))
+            result = await async_session.execute(stmt)
+            loaded = {row[self.key.key]: dict(row) for row in result.mappings()}
+
+            # a write committed while loading could have made these rows stale
+            if table_versions.get(self.model) == version:
+                for key, row in loaded.items():
+                    cache.set(key, row)
+            found |= loaded
+
+        return found
+
+    async def get_if_exist_many(self, instances: Iterable[Base], async_session: AsyncSession) -> dict[Any, Base]:
+        instances = {getattr(instance, self.key.key): instance for instance in instances}
+        rows = await self.get_many(instances, async_session)
+
+        resolved = await upsert(
+            (instance for key, instance in instances.items() if key not in rows),
+            self.key,
+            async_session
+        )
+        for key, row in rows.items():
+            make_transient_to_detached(existing := self.model(**row))
+            resolved[key] = await async_session.merge(existing, load=False)
+        return resolved
+
+    async def get_if_exist(self, instance: Base, async_session: AsyncSession) -> Base:
+        resolved = await self.get_if_exist_many([instance], async_session)
+        return resolved[getattr(instance, self.key.key)]
+
+
+city_cache = ReferenceCache(
+    CityORM, CityORM.name, settings.REFERENCE_CACHE_SIZE, settings.REFERENCE_CACHE_TTL
+)
+forwarder_cache = ReferenceCache(
+    ForwarderORM, ForwarderORM.com_name, settings.REFERENCE_CACHE_SIZE, settings.REFERENCE_CACHE_TTL
+)
+special_option_cache = ReferenceCache(
+    SpecialOptionORM, SpecialOptionORM.name, settings.REFERENCE_CACHE_SIZE, settings.REFERENCE_CACHE_TTL
+)
@@ -0,0 +1,97 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Protocol, Iterable
+
+from app.config import settings
+from .versions import table_versions
+
+
+# Where serialized query results and the table versions they are keyed by live. A backend shared by
+# worker processes has to keep shared versions too, so a write in one process invalidates all of them.
+class ResultCacheBackend(Protocol):
+    async def get(self, key: str) -> bytes | None:
+        ...
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    async def versions(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        ...
+
+    async def bump(self, tables: Iterable[str]):
+        ...
+
+
+# In-process backend bounded by the total size of the cached results, least recently used go first.
+class LocalResultCacheBackend:
+    def __init__(self, memory_size: int):
+        self.memory_size = memory_size
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._used = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _pop(self, key: str):
+        if (item := self._data.pop(key, None)) is not None:
+            self._used -= len(item[1])
+
+    async def get(self, key: str) -> bytes | None:
+        if (item := self._data.get(key)) is None:
+            return None
+
+        expires, value = item
+        if expires < time.monotonic():
+            self._pop(key)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.memory_size:
+            return
+
+        self._pop(key)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._used += len(value)
+        while self._used > self.memory_size:
+            _, (_, evicted) = self._data.popitem(last=False)
+            self._used -= len(evicted)
+
+    async def versions(self, tables: tuple[str, ...]) -> tuple[int, ...]:
+        return table_versions.get(*tables)
+
+    async def bump(self, tables: Iterable[str]):
+        # this process's counters are already bumped by the commit hook
+        pass
+
+
+class QueryResultCache:
+    def __init__(self, backend: ResultCacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def key(self, namespace: str, query_key: str, tables: tuple[str, ...]) -> str:
+        # versions are read before the query runs, a write committed meanwhile makes the entry unreachable
+        versions = await self.backend.versions(tables)
+        return hashlib.sha256(f'{namespace}|{query_key}|{versions}'.encode()).hexdigest()
+
+    async def get(self, key: str) -> bytes | None:
+        if (value := await self.backend.get(key)) is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes):
+        await self.backend.set(key, value, self.ttl)
+
+    async def invalidate(self, tables: Iterable[str]):
+        await self.backend.bump(tables)
+
+
+result_cache = QueryResultCache(LocalResultCacheBackend(settings.RESULT_CACHE_MEMORY_SIZE), settings.RESULT_CACHE_TTL)
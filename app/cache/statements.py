@@ -0,0 +1,24 @@
+from typing import Any, Callable, Hashable
+
+from .lru import LRUCache
+
+
+# Built statements keyed by their shape. Reusing the same statement object skips rebuilding it
+# and lets SQLAlchemy's compiled cache and asyncpg's prepared statements hit on every execution.
+class StatementCache:
+    def __init__(self, maxsize: int):
+        self._cache = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        if (stmt := self._cache.get(key)) is not None:
+            self.hits += 1
+            return stmt
+
+        self.misses += 1
+        self._cache.set(key, stmt := build())
+        return stmt
@@ -0,0 +1,71 @@
+from collections import defaultdict
+
+from sqlalchemy import Table, event, inspect
+from sqlalchemy.orm import Session, ORMExecuteState, DeclarativeBase
+
+
+# Per-table write counters of this process, bumped when a session that wrote to the table commits.
+# Cache keys embedding the versions of the tables they were read from go stale on the next write.
+class TableVersions:
+    def __init__(self):
+        self._versions: dict[str, int] = defaultdict(int)
+
+    def get(self, *tables: type[DeclarativeBase] | Table | str) -> tuple[int, ...]:
+        return tuple(self._versions[_table_name(table)] for table in tables)
+
+    def bump(self, *tables: type[DeclarativeBase] | Table | str):
+        for table in tables:
+            self._versions[_table_name(table)] += 1
+
+
+table_versions = TableVersions()
+
+
+def _table_name(table: type[DeclarativeBase] | Table | str) -> str:
+    return table if isinstance(table, str) else getattr(table, '__table__', table).name
+
+
+def _written_tables(session: Session) -> set[str]:
+    return session.info.setdefault('written_tables', set())
+
+
+def mark_written(session: Session, *tables: type[DeclarativeBase] | Table):
+    # for writes the events below can't see, like DML inside a CTE of a select
+    _written_tables(session).update(_table_name(table) for table in tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session: Session, flush_context):
+    written = _written_tables(session)
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        state = inspect(instance)
+        written.update(table.name for table in state.mapper.tables)
+        written.update(
+            relationship.secondary.name for relationship in state.mapper.relationships
+            if relationship.secondary is not None and state.attrs[relationship.key].history.has_changes()
+        )
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _do_orm_execute(orm_execute_state: ORMExecuteState):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _written_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session: Session):
+    # releasing a SAVEPOINT fires this as well, its writes are only visible after the outermost commit
+    if session.in_nested_transaction():
+        return
+
+    written = session.info.pop('written_tables', set())
+    table_versions.bump(*written)
+    # kept for the request session to publish to versions shared with other processes
+    session.info.setdefault('committed_tables', set()).update(written)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session: Session):
+    # a rolled back SAVEPOINT leaves what the transaction wrote before it
+    if not session.in_nested_transaction():
+        session.info.pop('written_tables', None)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -8,6 +9,42 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASSWORD: str
+
+    # a replica for read-only sessions, they use the primary when it isn't set
+    DB_READ_HOST: str | None = None
+    DB_READ_PORT: int | None = None
+
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # transaction pooling PgBouncer can't keep prepared statements between transactions
+    DB_PGBOUNCER: bool = False
+
+    REFERENCE_CACHE_SIZE: int = 10_000
+    REFERENCE_CACHE_TTL: float = 300
+
+    PDF_WORKERS: int = 2
+    PDF_QUEUE_SIZE: int = 8
+    PDF_BATCH_LIMIT: int = 500
+    # one worker builds a merged document and holds all of its pages until it is written out
+    PDF_MERGE_LIMIT: int = 200
+    PDF_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), 'receipts-pdf')
+    PDF_CACHE_DISK_SIZE: int = 512 * 1024 * 1024
+    PDF_CACHE_MEMORY_SIZE: int = 32 * 1024 * 1024
+
+    # a cached count is keyed by the version of the receipts, but a lagging replica can still return the count
+    # from before the write that moved it, so cached counts expire as well
+    COUNT_CACHE_TTL: float = 60
+
+    RESULT_CACHE_MEMORY_SIZE: int = 64 * 1024 * 1024
+    # bounds how long a page read from a lagging replica right after a write can be served
+    RESULT_CACHE_TTL: float = 60
+
+    # requests running more statements are counted and logged as likely N+1 query patterns
+    METRICS_N_PLUS_ONE_STATEMENTS: int = 10
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
@@ -16,6 +53,12 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
-def get_db_url():
+def get_db_url(host: str | None = None, port: int | None = None):
     return (f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
-            f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}")
+            f"{host or settings.DB_HOST}:{port or settings.DB_PORT}/{settings.DB_NAME}")
+
+
+def get_read_db_url():
+    if settings.DB_READ_HOST is None:
+        return None
+    return get_db_url(settings.DB_READ_HOST, settings.DB_READ_PORT)
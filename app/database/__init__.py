@@ -1,3 +1,4 @@
 from .annotations import *
-from .core import DATABASE_URL, engine, AsyncSessionM, Base, secondary_table
+from .core import DATABASE_URL, engine, read_engine, AsyncSessionM, AsyncReadSessionM, Base, secondary_table
 from .models import *
+from .session import get_session, get_read_session, SessionDep, ReadSessionDep
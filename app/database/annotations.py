@@ -6,7 +6,7 @@ from sqlalchemy.orm import mapped_column
 
 int_pk = Annotated[int, mapped_column(primary_key=True)]
 created_at = Annotated[datetime.datetime, mapped_column(server_default=func.now())]
-updated_at = Annotated[datetime.datetime, mapped_column(server_default=func.now(), onupdate=datetime.datetime.now)]
+updated_at = Annotated[datetime.datetime, mapped_column(server_default=func.now(), onupdate=func.now())]
 
 str_uniq = Annotated[str, mapped_column(unique=True, nullable=False)]
 str_null_true = Annotated[str, mapped_column(nullable=True)]
@@ -1,14 +1,57 @@
-from sqlalchemy import Table, Column, ForeignKey, select, BinaryExpression, func
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession
+import json
+import uuid
+from typing import Any, Iterable
+
+from sqlalchemy import Table, Column, ForeignKey, select, BinaryExpression, func, Executable, ClauseElement, Select, \
+    union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import make_url, URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs, AsyncSession, AsyncEngine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, declared_attr, Mapped
 
-from app.config import get_db_url
+from app.config import settings, get_db_url, get_read_db_url
+from app.metrics import InstrumentedPool, pool_collector
 from . import int_pk, created_at, updated_at
 
 DATABASE_URL = get_db_url()
+READ_DATABASE_URL = get_read_db_url()
+
+
+def make_engine(url: str | URL, name: str) -> AsyncEngine:
+    # the dialect prepares statements itself and keeps them in its own cache, asyncpg's isn't used
+    cache_size = 0 if settings.DB_PGBOUNCER else settings.DB_STATEMENT_CACHE_SIZE
+    url = make_url(url).update_query_dict({'prepared_statement_cache_size': str(cache_size)})
+    # timestamps are stored without a time zone and written by now(), sessions run in UTC so they are UTC
+    connect_args = {'server_settings': {'timezone': 'UTC'}}
+    if settings.DB_PGBOUNCER:
+        # unnamed statements aren't shared between server connections, and names can't collide
+        connect_args |= {
+            'statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid.uuid4()}__',
+        }
+
+    async_engine = create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_logging_name=name,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args
+    )
+    pool_collector.add(async_engine.pool)
+    return async_engine
+
+
+engine = make_engine(DATABASE_URL, 'primary')
+read_engine = make_engine(READ_DATABASE_URL, 'replica') if READ_DATABASE_URL is not None else engine
 
-engine = create_async_engine(DATABASE_URL)
 AsyncSessionM = async_sessionmaker(engine, expire_on_commit=False)
+# for reads that tolerate replication lag, never for writes
+AsyncReadSessionM = async_sessionmaker(read_engine, expire_on_commit=False)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -31,20 +74,62 @@ def secondary_table(parent: str, children: type[Base]) -> Table:
     )
 
 
-async def get_if_exist(instance: Base, *attrs: Column, async_session: AsyncSession):
-    stmt = (
-        select(type(instance))
-        .filter(*(attr == getattr(instance, attr.key) for attr in attrs))
-        .limit(1)
+async def upsert(instances: Iterable[Base], attr: Column, async_session: AsyncSession) -> dict[Any, Base]:
+    instances = {getattr(instance, attr.key): instance for instance in instances}
+    if not instances:
+        return {}
+
+    model = type(next(iter(instances.values())))
+    table: Table = model.__table__
+    keys = [column.key for column in table.c if any(column.key in vars(instance) for instance in instances.values())]
+
+    # new keys come back from INSERT ... RETURNING, existing ones from the snapshot select of the
+    # same statement, so concurrent creators can't fail each other; sorted rows keep lock order stable
+    inserted = (
+        insert(table)
+        .values([{key: getattr(instance, key) for key in keys} for _, instance in sorted(instances.items())])
+        .on_conflict_do_nothing(index_elements=[attr.key])
+        .returning(*table.c)
+        .cte('inserted')
+    )
+    stmt = select(model).from_statement(
+        union_all(select(inserted), select(table).filter(attr.in_(instances)))
     )
     result = await async_session.execute(stmt)
-    if (new_instance := result.scalars().first()) is not None:
-        return new_instance
-    else:
-        return instance
+    resolved = {getattr(instance, attr.key): instance for instance in result.scalars()}
 
+    # a key inserted by a transaction that committed after our snapshot is visible to a new statement
+    if missing := instances.keys() - resolved.keys():
+        result = await async_session.execute(select(model).filter(attr.in_(missing)))
+        resolved |= {getattr(instance, attr.key): instance for instance in result.scalars()}
 
-async def get_count(model: type[Base], *filters: BinaryExpression, async_session: AsyncSession) -> int:
+    return resolved
+
+
+async def get_count(model: type[Base], *filters: BinaryExpression, async_session: AsyncSession,
+                    params: dict[str, Any] | None = None) -> int:
     stmt = (select(func.count(model.id)).filter(*filters))
-    result = await async_session.execute(stmt)
+    result = await async_session.execute(stmt, params)
     return result.scalars().one()
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement: Select):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element: Explain, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+async def get_estimated_count(model: type[Base], *filters: BinaryExpression, async_session: AsyncSession,
+                              params: dict[str, Any] | None = None) -> int:
+    stmt = Explain(select(model.id).filter(*filters))
+    result = await async_session.execute(stmt, params)
+    plan = result.scalars().one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
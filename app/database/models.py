@@ -2,11 +2,12 @@ import enum
 import datetime
 from typing import Annotated
 
-from sqlalchemy import ForeignKey, Enum, DATE
+from sqlalchemy import ForeignKey, Enum, DATE, Index, Computed, BIGINT, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base, str_null_false, smallint_null_true, secondary_table, float_null_false, \
-    smallint_null_false, bool_null_false, date_null_true, str_null_true, int_pk
+    smallint_null_false, bool_null_false, date_null_true, str_null_true, int_pk, str_uniq
 
 
 class ForwarderORM(Base):
@@ -21,7 +22,7 @@ class ForwarderORM(Base):
 class SpecialOptionORM(Base):
     id: Mapped[int_pk]
 
-    name: Mapped[str_null_false]
+    name: Mapped[str_uniq]
     ordered: Mapped[smallint_null_true]
 
 
@@ -59,7 +60,19 @@ class PartShipORM(Base):
     volume: Mapped[float_null_false]
 
 
+SEARCH_CONFIG = 'russian'
+
+
 class ReceiptORM(Base):
+    __searchable__ = ('shipper', 'consignee', 'customer', 'container', 'doc', 'product_code')
+    __table_args__ = (
+        *(
+            Index(f'ix_receiptorm_{column}_trgm', column, postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+            for column in __searchable__
+        ),
+        Index('ix_receiptorm_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
     id: Mapped[int_pk]
 
     price: Mapped[float_null_false]
@@ -86,6 +99,15 @@ class ReceiptORM(Base):
     product: Mapped[str_null_false]
     comment: Mapped[str_null_true]
 
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(shipper, '') || ' ' || coalesce(consignee, '') || ' ' "
+        f"|| coalesce(customer, '')), 'A') "
+        f"|| setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(container, '')), 'B') "
+        f"|| setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(product, '') || ' ' || coalesce(address, '')), 'C') "
+        f"|| setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(comment, '')), 'D')",
+        persisted=True
+    ), deferred=True)
+
     city: Mapped[str] = mapped_column(ForeignKey(CityORM.name))
     forwarder: Mapped[str] = mapped_column(ForeignKey(ForwarderORM.com_name))
 
@@ -96,6 +118,31 @@ class ReceiptORM(Base):
     forwarder_r: Mapped[ForwarderORM] = relationship(ForwarderORM, foreign_keys=[forwarder], uselist=False)
 
 
+# Totals of receipts per group, maintained by statement level triggers on ReceiptORM. Crate and
+# part ship writes change the receipt totals, so they reach the summary through the same triggers.
+class ReceiptSummaryORM(Base):
+    __table_args__ = (
+        Index(
+            'ux_receiptsummaryorm_group',
+            'city', 'forwarder', 'status', text("coalesce(date_of_load, 'infinity'::date)"),
+            unique=True
+        ),
+    )
+
+    id: Mapped[int_pk]
+
+    city: Mapped[str]
+    forwarder: Mapped[str]
+    status: Mapped[Annotated[StatusEnum, mapped_column(StatusEnumORM)]]
+    date_of_load: Mapped[date_null_true]
+
+    receipt_count: Mapped[int]
+    place_count: Mapped[int] = mapped_column(BIGINT)
+    weight: Mapped[int] = mapped_column(BIGINT)
+    volume: Mapped[float]
+    price: Mapped[float]
+
+
 class AttorneyORM(Base):
     id: Mapped[int_pk]
 
@@ -0,0 +1,31 @@
+from typing import Annotated, AsyncIterator
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache.results import result_cache
+from . import core
+
+
+# One session, one connection and one transaction per request. The transaction commits when the
+# handler returns, before the response is sent, and rolls back if it raises.
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async with core.AsyncSessionM() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        else:
+            await session.commit()
+            if committed := session.info.pop('committed_tables', None):
+                await result_cache.invalidate(committed)
+
+
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    async with core.AsyncReadSessionM() as session:
+        yield session
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
@@ -1,10 +1,29 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from app.metrics import MetricsMiddleware
+from app.routers import receipts_router, crate_router, part_ship_router, part_ship_batch_router, reports_router, \
+    metrics_router
+from services.documents.pool import document_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    document_pool.shutdown()
 
-from app.routers import receipts_router, crate_router, part_ship_router
 
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
-app = FastAPI()
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(MetricsMiddleware)
 
+app.include_router(part_ship_batch_router)
 app.include_router(receipts_router)
 app.include_router(crate_router)
 app.include_router(part_ship_router)
+app.include_router(reports_router)
+app.include_router(metrics_router)
@@ -0,0 +1,136 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from prometheus_client import Histogram, Counter, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LABELS = ('method', 'route')
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request latency by route', (*REQUEST_LABELS, 'status')
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'SQL statements executed per request', REQUEST_LABELS,
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+)
+REQUEST_SQL_DURATION = Histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request', REQUEST_LABELS
+)
+REQUEST_POOL_WAIT = Histogram(
+    'http_request_pool_wait_seconds', 'Time spent waiting for pooled connections per request', REQUEST_LABELS
+)
+REQUEST_N_PLUS_ONE = Counter(
+    'http_request_n_plus_one', 'Requests that executed more SQL statements than the threshold', REQUEST_LABELS
+)
+POOL_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection', ('pool',)
+)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    sql_seconds: float = 0
+    pool_wait_seconds: float = 0
+    started: list[float] = field(default_factory=list)
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar('request_stats', default=None)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if (stats := _request_stats.get()) is not None:
+        stats.started.append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if (stats := _request_stats.get()) is not None and stats.started:
+        stats.statements += 1
+        stats.sql_seconds += time.perf_counter() - stats.started.pop()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            POOL_WAIT.labels(self.logging_name).observe(wait)
+            if (stats := _request_stats.get()) is not None:
+                stats.pool_wait_seconds += wait
+
+
+class PoolCollector:
+    def __init__(self):
+        self._pools: dict[str, QueuePool] = {}
+
+    def add(self, pool: QueuePool):
+        self._pools[pool.logging_name] = pool
+
+    def collect(self):
+        connections = GaugeMetricFamily('db_pool_connections', 'Pooled connections by state', labels=('pool', 'state'))
+        saturation = GaugeMetricFamily(
+            'db_pool_saturation', 'Checked out connections over the pool size plus overflow', labels=('pool',)
+        )
+        for name, pool in self._pools.items():
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            connections.add_metric((name, 'checked_out'), pool.checkedout())
+            connections.add_metric((name, 'idle'), pool.checkedin())
+            connections.add_metric((name, 'overflow'), max(pool.overflow(), 0))
+            saturation.add_metric((name,), pool.checkedout() / capacity)
+        yield connections
+        yield saturation
+
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message: Message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _request_stats.reset(token)
+            # templated paths keep the label set bounded, unmatched requests share one label
+            route = getattr(scope.get('route'), 'path', '<unmatched>')
+            labels = (scope['method'], route)
+            REQUEST_DURATION.labels(*labels, status).observe(time.perf_counter() - start)
+            REQUEST_SQL_STATEMENTS.labels(*labels).observe(stats.statements)
+            REQUEST_SQL_DURATION.labels(*labels).observe(stats.sql_seconds)
+            REQUEST_POOL_WAIT.labels(*labels).observe(stats.pool_wait_seconds)
+
+            if stats.statements > settings.METRICS_N_PLUS_ONE_STATEMENTS:
+                REQUEST_N_PLUS_ONE.labels(*labels).inc()
+                logger.warning('%s %s executed %d SQL statements', *labels, stats.statements)
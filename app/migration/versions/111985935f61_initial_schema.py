@@ -0,0 +1,143 @@
+"""initial schema
+
+Revision ID: 111985935f61
+Revises: 
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '111985935f61'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('AttorneyORM',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('number', sa.SMALLINT(), nullable=True),
+    sa.Column('com_name', sa.SMALLINT(), nullable=False),
+    sa.Column('partner_name', sa.String(), nullable=True),
+    sa.Column('started', sa.DATE(), nullable=True),
+    sa.Column('finished', sa.DATE(), nullable=True),
+    sa.Column('passport', sa.String(), nullable=True),
+    sa.Column('permission', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('CeilColorORM',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tablename', sa.String(), nullable=True),
+    sa.Column('column_name', sa.String(), nullable=True),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('_color', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('CityORM',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('partner_name', sa.String(), nullable=True),
+    sa.Column('partner_address', sa.String(), nullable=True),
+    sa.Column('partner_phone', sa.String(), nullable=True),
+    sa.Column('is_paid_entry', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('ForwarderORM',
+    sa.Column('com_name', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('phone', sa.String(), nullable=True),
+    sa.Column('address', sa.String(), nullable=True),
+    sa.Column('site', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('com_name')
+    )
+    op.create_table('SpecialOptionORM',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('ordered', sa.SMALLINT(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('ReceiptORM',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('place_count', sa.SMALLINT(), nullable=False),
+    sa.Column('weight', sa.SMALLINT(), nullable=False),
+    sa.Column('volume', sa.Float(), nullable=False),
+    sa.Column('product_code', sa.String(), nullable=True),
+    sa.Column('doc', sa.String(), nullable=True),
+    sa.Column('address', sa.String(), nullable=True),
+    sa.Column('in_nsk', sa.Boolean(), nullable=False),
+    sa.Column('shipper_fullname', sa.String(), nullable=True),
+    sa.Column('is_add_container', sa.Boolean(), nullable=False),
+    sa.Column('status', sa.Enum('in_stock', 'shipped', 'refund', name='statusenum'), nullable=False),
+    sa.Column('carriage_number', sa.SMALLINT(), nullable=True),
+    sa.Column('date_of_load', sa.DATE(), nullable=True),
+    sa.Column('shipper', sa.String(), nullable=True),
+    sa.Column('shipper_phone', sa.String(), nullable=True),
+    sa.Column('consignee', sa.String(), nullable=True),
+    sa.Column('consignee_phone', sa.String(), nullable=True),
+    sa.Column('customer', sa.String(), nullable=True),
+    sa.Column('container', sa.String(), nullable=True),
+    sa.Column('product', sa.String(), nullable=True),
+    sa.Column('comment', sa.String(), nullable=True),
+    sa.Column('city', sa.String(), nullable=False),
+    sa.Column('forwarder', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['city'], ['CityORM.name'], ),
+    sa.ForeignKeyConstraint(['forwarder'], ['ForwarderORM.com_name'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('CrateORM',
+    sa.Column('receipt_id', sa.Integer(), nullable=False),
+    sa.Column('old_weight', sa.SMALLINT(), nullable=False),
+    sa.Column('old_volume', sa.SMALLINT(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['receipt_id'], ['ReceiptORM.id'], ),
+    sa.PrimaryKeyConstraint('receipt_id')
+    )
+    op.create_table('PartShipORM',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('receipt_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DATE(), nullable=False),
+    sa.Column('place_count', sa.SMALLINT(), nullable=False),
+    sa.Column('weight', sa.SMALLINT(), nullable=False),
+    sa.Column('volume', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['receipt_id'], ['ReceiptORM.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('_association_receiptorm_specialoptionorm',
+    sa.Column('left_id', sa.Integer(), nullable=True),
+    sa.Column('right_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['left_id'], ['ReceiptORM.id'], ),
+    sa.ForeignKeyConstraint(['right_id'], ['SpecialOptionORM.id'], )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('_association_receiptorm_specialoptionorm')
+    op.drop_table('PartShipORM')
+    op.drop_table('CrateORM')
+    op.drop_table('ReceiptORM')
+    op.drop_table('SpecialOptionORM')
+    op.drop_table('ForwarderORM')
+    op.drop_table('CityORM')
+    op.drop_table('CeilColorORM')
+    op.drop_table('AttorneyORM')
+    sa.Enum(name='statusenum').drop(op.get_bind())
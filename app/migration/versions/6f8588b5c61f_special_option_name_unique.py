@@ -0,0 +1,48 @@
+"""special option name unique
+
+Revision ID: 6f8588b5c61f
+Revises: 705c8fbe2e36
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f8588b5c61f'
+down_revision: Union[str, None] = '705c8fbe2e36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""UPDATE "SpecialOptionORM" SET name = '' WHERE name IS NULL""")
+
+    # merge duplicated options into the one with the lowest id before the constraint is added
+    op.execute("""
+        UPDATE "_association_receiptorm_specialoptionorm" AS a
+        SET right_id = d.keep_id
+        FROM (SELECT id, min(id) OVER (PARTITION BY name) AS keep_id FROM "SpecialOptionORM") AS d
+        WHERE a.right_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM "_association_receiptorm_specialoptionorm" AS a
+        USING "_association_receiptorm_specialoptionorm" AS b
+        WHERE a.left_id = b.left_id AND a.right_id = b.right_id AND a.ctid > b.ctid
+    """)
+    op.execute("""
+        DELETE FROM "SpecialOptionORM" AS o
+        USING "SpecialOptionORM" AS keep
+        WHERE o.name = keep.name AND o.id > keep.id
+    """)
+
+    op.alter_column('SpecialOptionORM', 'name', existing_type=sa.String(), nullable=False)
+    op.create_unique_constraint('SpecialOptionORM_name_key', 'SpecialOptionORM', ['name'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('SpecialOptionORM_name_key', 'SpecialOptionORM', type_='unique')
+    op.alter_column('SpecialOptionORM', 'name', existing_type=sa.String(), nullable=True)
@@ -0,0 +1,119 @@
+"""receipt summary
+
+Revision ID: 7f0d2d3c79c4
+Revises: fb3fb761549e
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f0d2d3c79c4'
+down_revision: Union[str, None] = 'fb3fb761549e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SUMMARY_ROWS = """
+    SELECT city, forwarder, status, date_of_load,
+        {sign}1 AS receipt_count, {sign}place_count AS place_count, {sign}weight AS weight,
+        {sign}volume AS volume, {sign}price AS price
+    FROM {rows}
+"""
+
+# One upsert of the net change per group, applied in group order: concurrent writers lock the groups they share
+# in the same order, and groups whose totals don't change, like those of a comment edit, aren't locked at all.
+SUMMARY_DELTA = """
+    INSERT INTO "ReceiptSummaryORM" AS summary
+        (city, forwarder, status, date_of_load, receipt_count, place_count, weight, volume, price)
+    SELECT city, forwarder, status, date_of_load,
+        sum(receipt_count), sum(place_count), sum(weight), sum(volume), sum(price)
+    FROM ({rows}) AS delta
+    GROUP BY city, forwarder, status, date_of_load
+    HAVING sum(receipt_count) <> 0 OR sum(place_count) <> 0 OR sum(weight) <> 0 OR sum(volume) <> 0
+        OR sum(price) <> 0
+    ORDER BY city, forwarder, status, date_of_load
+    ON CONFLICT (city, forwarder, status, coalesce(date_of_load, 'infinity'::date)) DO UPDATE SET
+        receipt_count = summary.receipt_count + excluded.receipt_count,
+        place_count = summary.place_count + excluded.place_count,
+        weight = summary.weight + excluded.weight,
+        volume = summary.volume + excluded.volume,
+        price = summary.price + excluded.price,
+        updated_at = now();
+"""
+OLD_ROWS = SUMMARY_ROWS.format(sign='-', rows='old_rows')
+NEW_ROWS = SUMMARY_ROWS.format(sign='', rows='new_rows')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'ReceiptSummaryORM',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city', sa.String(), nullable=False),
+        sa.Column('forwarder', sa.String(), nullable=False),
+        sa.Column('status', postgresql.ENUM(name='statusenum', create_type=False), nullable=False),
+        sa.Column('date_of_load', sa.DATE(), nullable=True),
+        sa.Column('receipt_count', sa.Integer(), nullable=False),
+        sa.Column('place_count', sa.BIGINT(), nullable=False),
+        sa.Column('weight', sa.BIGINT(), nullable=False),
+        sa.Column('volume', sa.Float(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ux_receiptsummaryorm_group',
+        'ReceiptSummaryORM',
+        ['city', 'forwarder', 'status', sa.text("coalesce(date_of_load, 'infinity'::date)")],
+        unique=True
+    )
+
+    # statement level triggers with transition tables, a bulk write applies one delta per group
+    op.execute(f"""
+        CREATE FUNCTION receipt_summary_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            -- a transition table can only be named by the triggers that declare it
+            IF TG_OP = 'INSERT' THEN
+                {SUMMARY_DELTA.format(rows=NEW_ROWS)}
+            ELSIF TG_OP = 'DELETE' THEN
+                {SUMMARY_DELTA.format(rows=OLD_ROWS)}
+            ELSE
+                {SUMMARY_DELTA.format(rows=OLD_ROWS + ' UNION ALL ' + NEW_ROWS)}
+            END IF;
+            DELETE FROM "ReceiptSummaryORM" WHERE receipt_count = 0;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER receipt_summary_insert AFTER INSERT ON "ReceiptORM"
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE receipt_summary_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER receipt_summary_update AFTER UPDATE ON "ReceiptORM"
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE receipt_summary_apply()
+    """)
+    op.execute("""
+        CREATE TRIGGER receipt_summary_delete AFTER DELETE ON "ReceiptORM"
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE receipt_summary_apply()
+    """)
+
+    op.execute(SUMMARY_DELTA.format(rows=SUMMARY_ROWS.format(sign='', rows='"ReceiptORM"')))
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER receipt_summary_delete ON "ReceiptORM"')
+    op.execute('DROP TRIGGER receipt_summary_update ON "ReceiptORM"')
+    op.execute('DROP TRIGGER receipt_summary_insert ON "ReceiptORM"')
+    op.execute('DROP FUNCTION receipt_summary_apply()')
+    op.drop_index('ux_receiptsummaryorm_group', table_name='ReceiptSummaryORM')
+    op.drop_table('ReceiptSummaryORM')
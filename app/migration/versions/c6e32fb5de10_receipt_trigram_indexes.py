@@ -0,0 +1,48 @@
+"""receipt trigram indexes
+
+Revision ID: c6e32fb5de10
+Revises: 6f8588b5c61f
+Create Date: 2026-10-18 12:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e32fb5de10'
+down_revision: Union[str, None] = '6f8588b5c61f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCHABLE = ('shipper', 'consignee', 'customer', 'container', 'doc', 'product_code')
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # built concurrently so receipts stay writable while the indexes are created
+    with op.get_context().autocommit_block():
+        for column in SEARCHABLE:
+            op.create_index(
+                f'ix_receiptorm_{column}_trgm',
+                'ReceiptORM',
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in SEARCHABLE:
+            op.drop_index(
+                f'ix_receiptorm_{column}_trgm',
+                table_name='ReceiptORM',
+                postgresql_concurrently=True,
+                if_exists=True
+            )
@@ -0,0 +1,45 @@
+"""receipt search vector
+
+Revision ID: fb3fb761549e
+Revises: c6e32fb5de10
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fb3fb761549e'
+down_revision: Union[str, None] = 'c6e32fb5de10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ReceiptORM', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('russian', coalesce(shipper, '') || ' ' || coalesce(consignee, '') || ' ' "
+        "|| coalesce(customer, '')), 'A') "
+        "|| setweight(to_tsvector('russian', coalesce(container, '')), 'B') "
+        "|| setweight(to_tsvector('russian', coalesce(product, '') || ' ' || coalesce(address, '')), 'C') "
+        "|| setweight(to_tsvector('russian', coalesce(comment, '')), 'D')",
+        persisted=True
+    )))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_receiptorm_search_vector',
+            'ReceiptORM',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_receiptorm_search_vector', table_name='ReceiptORM')
+    op.drop_column('ReceiptORM', 'search_vector')
@@ -1,3 +1,5 @@
 from .receipts import router as receipts_router
 from .crate import router as crate_router
-from .part_ships import router as part_ship_router
+from .part_ships import router as part_ship_router, batch_router as part_ship_batch_router
+from .reports import router as reports_router
+from .metrics import router as metrics_router
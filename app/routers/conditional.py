@@ -0,0 +1,55 @@
+import datetime
+import email.utils
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def datetime_etag(value: datetime.datetime) -> str:
+    return f'"{value.isoformat()}"'
+
+
+def parse_etag_datetime(value: str) -> datetime.datetime:
+    # accepts the ETag as sent back by clients as well as a bare ISO timestamp
+    return datetime.datetime.fromisoformat(value.strip().removeprefix('W/').strip('"'))
+
+
+def parse_if_match(value: str) -> datetime.datetime | None:
+    # '*' matches any current representation, the edit then only needs the receipt to exist
+    if value.strip() == '*':
+        return None
+    return parse_etag_datetime(value)
+
+
+def http_date(value: datetime.datetime) -> str:
+    # stored timestamps are naive UTC, the database sessions run in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return email.utils.format_datetime(value.astimezone(datetime.timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def parse_http_date(value: str) -> datetime.datetime:
+    parsed = email.utils.parsedate_to_datetime(value)
+    return parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def validator_headers(etag: str, last_modified: datetime.datetime) -> dict[str, str]:
+    return {'ETag': etag, 'Last-Modified': http_date(last_modified), 'Cache-Control': 'no-cache'}
+
+
+def not_modified(headers: dict[str, str], if_none_match: str | None, if_modified_since: str | None) -> bool:
+    # If-Modified-Since is only looked at when there is no If-None-Match, as RFC 9110 requires
+    if if_none_match is not None:
+        return etag_matches(if_none_match, headers['ETag'])
+
+    if if_modified_since is None:
+        return False
+    try:
+        return parse_http_date(headers['Last-Modified']) <= parse_http_date(if_modified_since)
+    except (TypeError, ValueError):
+        return False
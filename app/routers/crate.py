@@ -1,11 +1,12 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from fastapi import APIRouter, Depends, Header
+from starlette.responses import Response
 
-from app.database import AsyncSessionM, CrateORM, ReceiptORM
+from app.database import SessionDep, ReadSessionDep
+from app.routers.conditional import datetime_etag, validator_headers, not_modified
 from app.schemas import SGetCrateResult, SAddResult, SSetCrate, SDeleteResult
+from services import crate as crate_service
 
 router = APIRouter(
     prefix='/receipts/{receipt_id}/crate',
@@ -13,58 +14,31 @@ router = APIRouter(
 )
 
 
-@router.get('/')
-async def get_crate(receipt_id: int) -> SGetCrateResult:
-    async with AsyncSessionM() as session:
-        query = (select(ReceiptORM).options(selectinload(ReceiptORM.crate_r))
-                 .filter(ReceiptORM.id == receipt_id))
-        result = await session.execute(query)
+@router.get('/', response_model=SGetCrateResult)
+async def get_crate(receipt_id: int, response: Response, session: ReadSessionDep,
+                    if_none_match: Annotated[str | None, Header()] = None,
+                    if_modified_since: Annotated[str | None, Header()] = None) -> SGetCrateResult | Response:
+    updated = await crate_service.get_crate_updated(receipt_id, session)
+    headers = validator_headers(datetime_etag(updated), updated)
+    if not_modified(headers, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
 
-        if (receipt := result.scalars().first()) is None:
-            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    response.headers.update(headers)
+    receipt = await crate_service.get_receipt_with_crate(receipt_id, session)
 
-        elif receipt.crate_r is None:
-            return SGetCrateResult(exist=False)
+    if receipt.crate_r is None:
+        return SGetCrateResult(exist=False)
 
-        else:
-            return SGetCrateResult(old_wight=receipt.crate_r.old_weight, old_volume=receipt.crate_r.old_volume)
+    else:
+        return SGetCrateResult(old_wight=receipt.crate_r.old_weight, old_volume=receipt.crate_r.old_volume)
 
 
 @router.post('/')
-async def set_crate(receipt_id: int, crate: Annotated[SSetCrate, Depends()]) -> SAddResult:
-    async with AsyncSessionM() as session:
-        query = (select(ReceiptORM).options(selectinload(ReceiptORM.crate_r))
-                 .filter(ReceiptORM.id == receipt_id))
-        result = await session.execute(query)
-
-        if (receipt := result.scalars().first()) is None:
-            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
-
-        else:
-            receipt: ReceiptORM
-            if receipt.crate_r is None:
-                receipt.crate_r = CrateORM(old_volume=receipt.volume, old_weight=receipt.weight)
-
-            receipt.volume = crate.new_volume
-            receipt.weight = crate.new_wight
-
-            await session.flush()
-            await session.commit()
-
-        return SAddResult(new_id=receipt.crate_r.receipt_id, created=receipt.crate_r.created_at)
+async def set_crate(receipt_id: int, crate: Annotated[SSetCrate, Depends()], session: SessionDep) -> SAddResult:
+    crate = await crate_service.set_crate(receipt_id, crate, session)
+    return SAddResult(new_id=crate.receipt_id, created=crate.created_at)
 
 
 @router.delete('/')
-async def delete_crate(receipt_id: int) -> SDeleteResult:
-    async with AsyncSessionM() as session:
-        query = (select(CrateORM).filter(CrateORM.receipt_id == receipt_id))
-        result = await session.execute(query)
-
-        if (crate := result.scalars().first()) is None:
-            return SDeleteResult(was_deleted=False)
-
-        else:
-            await session.delete(crate)
-            await session.commit()
-            return SDeleteResult(was_deleted=True)
-        
\ No newline at end of file
+async def delete_crate(receipt_id: int, session: SessionDep) -> SDeleteResult:
+    return SDeleteResult(was_deleted=await crate_service.delete_crate(receipt_id, session))
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from starlette.responses import Response
+
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+
+@router.get('/metrics', include_in_schema=False)
+async def get_metrics() -> Response:
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,84 +1,55 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from fastapi import APIRouter, Depends, Header
+from starlette.responses import Response
 
-from app.database import AsyncSessionM, ReceiptORM, PartShipORM
-from app.schemas import SAddResult, SDeleteResult
-from app.schemas.part_ships import SPartShip, SPartShipAdd
+from app.database import SessionDep, ReadSessionDep
+from app.routers.conditional import validator_headers, not_modified
+from app.schemas import SAddResult, SDeleteResult, SBulkAddResult
+from app.schemas.part_ships import SPartShip, SPartShipAdd, SPartShipBatchAdd
+from services import part_ships as part_ship_service
 
 router = APIRouter(
     prefix='/receipts/{receipt_id}/part-ships',
     tags=["Part Ships"]
 )
+batch_router = APIRouter(
+    prefix='/receipts/part-ships',
+    tags=["Part Ships"]
+)
 
 
-@router.get('/')
-async def get_part_ships(receipt_id: int) -> list[SPartShip]:
-    async with AsyncSessionM() as session:
-        query = (select(ReceiptORM).options(selectinload(ReceiptORM.part_ships_r))
-                 .filter(ReceiptORM.id == receipt_id))
-        result = await session.execute(query)
-
-        if (receipt := result.scalars().first()) is None:
-            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+@router.get('/', response_model=list[SPartShip])
+async def get_part_ships(receipt_id: int, response: Response, session: ReadSessionDep,
+                         if_none_match: Annotated[str | None, Header()] = None,
+                         if_modified_since: Annotated[str | None, Header()] = None) -> list[SPartShip] | Response:
+    count, updated = await part_ship_service.get_part_ships_version(receipt_id, session)
+    headers = validator_headers(f'"{count}-{updated.isoformat()}"', updated)
+    if not_modified(headers, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
 
-        else:
-            return [SPartShip(
-                id=part_ship.id,
-                date=part_ship.date,
-                place_count=part_ship.place_count,
-                volume=part_ship.volume,
-                weight=part_ship.weight
-            ) for part_ship in receipt.part_ships_r]
+    response.headers.update(headers)
+    return [SPartShip(
+        id=part_ship.id,
+        date=part_ship.date,
+        place_count=part_ship.place_count,
+        volume=part_ship.volume,
+        weight=part_ship.weight
+    ) for part_ship in await part_ship_service.get_part_ships(receipt_id, session)]
 
 
 @router.post('/')
-async def add_part_ship(receipt_id: int, part_ship: Annotated[SPartShipAdd, Depends()]) -> SAddResult:
-    async with AsyncSessionM() as session:
-        query = (select(ReceiptORM).options(selectinload(ReceiptORM.part_ships_r))
-                 .filter(ReceiptORM.id == receipt_id))
-        result = await session.execute(query)
-
-        if (receipt := result.scalars().first()) is None:
-            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
-
-        else:
-            receipt.part_ships_r.append(new_part_ship := PartShipORM(
-                date=part_ship.date,
-                place_count=part_ship.place_count,
-                weight=part_ship.weight,
-                volume=part_ship.volume
-            ))
-
-            receipt.place_count -= part_ship.place_count
-            receipt.volume -= part_ship.volume
-            receipt.weight -= part_ship.weight
-
-            await session.flush()
-            await session.commit()
-
-            return SAddResult(new_id=new_part_ship.id, created=new_part_ship.created_at)
+async def add_part_ship(receipt_id: int, part_ship: Annotated[SPartShipAdd, Depends()],
+                        session: SessionDep) -> SAddResult:
+    row = await part_ship_service.add_part_ship(receipt_id, part_ship, session)
+    return SAddResult(new_id=row.id, created=row.created_at)
 
 
 @router.delete('/{part_ship_id}')
-async def delete_part_ship(receipt_id: int, part_ship_id: int) -> SDeleteResult:
-    async with AsyncSessionM() as session:
-        query = (select(ReceiptORM).filter(ReceiptORM.id == receipt_id))
-        result = await session.execute(query)
-
-        if (result.scalars().first()) is None:
-            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
-
-        query = (select(PartShipORM).filter(PartShipORM.id == part_ship_id))
-        result = await session.execute(query)
-
-        if (part_ship := result.scalars().first()) is None:
-            return SDeleteResult(was_deleted=False)
+async def delete_part_ship(receipt_id: int, part_ship_id: int, session: SessionDep) -> SDeleteResult:
+    return SDeleteResult(was_deleted=await part_ship_service.delete_part_ship(receipt_id, part_ship_id, session))
 
-        else:
-            await session.delete(part_ship)
-            await session.commit()
 
-            return SDeleteResult(was_deleted=True)
+@batch_router.post('/batch')
+async def add_part_ships(part_ships: list[SPartShipBatchAdd], session: SessionDep) -> SBulkAddResult:
+    return SBulkAddResult(new_ids=await part_ship_service.add_part_ships(part_ships, session))
@@ -1,15 +1,36 @@
-from typing import Annotated
+import asyncio
+import csv
+import io
+import os
+import tempfile
+import zipfile
+from collections import deque
+from typing import Annotated, Iterable, AsyncIterator
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, HTTPException
+import anyio
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Header
+from fastapi.responses import ORJSONResponse
+from pydantic import ValidationError
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from starlette.responses import FileResponse
+from starlette.background import BackgroundTask
+from starlette.responses import Response, StreamingResponse, FileResponse
 
-from app.database import AsyncSessionM, ReceiptORM, CityORM, SpecialOptionORM, ForwarderORM
-from app.database.core import get_if_exist, get_count
-from app.schemas import SReceipt, SGetQuery, get_sqlalchemy_filter, get_sqlalchemy_order, SReceiptAdd, SAddResult, \
-    SReceiptQueryResult, SGetQueryFilter, SGetQueryOperation, SReceiptUpdateResult, SReceiptEdit
-from services.documents.receipt import create_receipt_doc
+from app.database import AsyncReadSessionM, ReceiptORM, SessionDep, ReadSessionDep
+from app.cache import forwarder_cache, document_cache, result_cache
+from app.schemas import SReceipt, SGetQuery, get_sqlalchemy_order, SReceiptAdd, SAddResult, SReceiptQueryResult, \
+    SReceiptUpdateResult, SReceiptEdit, SGetExportQuery, SGetQueryExportFormat, SBulkAddResult, SBulkRowError, \
+    SGetSearchQuery, SCacheStats, SGetDocumentsQuery, SGetQueryDocumentFormat, SReceiptStatusEdit, SBulkUpdateResult, \
+    get_query_key
+from app.routers.conditional import etag_matches, parse_if_match, datetime_etag, validator_headers, not_modified
+from services import receipts as receipt_service
+from services.receipts import statement_cache, receipt_filters, receipt_schema, get_special_options, \
+    RECEIPT_QUERY_TABLES
+from services.documents import create_receipt_doc
+from services.documents.func import merge_document_files
+from services.documents.receipt import TEMPLATE_VERSION as RECEIPT_TEMPLATE_VERSION
+from services.documents.pool import document_pool, DocumentPoolBusy
 
 router = APIRouter(
     prefix='/receipts',
@@ -17,195 +38,286 @@ router = APIRouter(
 )
 
 
-@router.post('/query')
-async def get_receipts(query: Annotated[SGetQuery, Depends()]) -> SReceiptQueryResult:
-    async with AsyncSessionM() as session:
-        query = (
-            select(ReceiptORM)
-            .options(
-                selectinload(ReceiptORM.city_r),
-                selectinload(ReceiptORM.special_options_r),
-                selectinload(ReceiptORM.forwarder_r),
-            )
-            .filter(*(filters := [get_sqlalchemy_filter(ReceiptORM, q_filter) for q_filter in query.filters]))
-            .order_by(*(get_sqlalchemy_order(ReceiptORM, q_order) for q_order in query.orders))
-            .limit(query.limit).offset(query.offset)
-        )
-        result = await session.execute(query)
-        models = result.scalars().all()
-        schemas = [
-            SReceipt(
-                city=model.city,
-                shipper=model.shipper,
-                consignee=model.consignee,
-                customer=model.customer,
-                forwarder=model.forwarder,
-                weight=model.weight,
-                volume=model.volume,
-                shipper_fullname=model.shipper_fullname,
-                special_options=[option.name for option in model.special_options_r],
-                status=model.status,
-                shipper_phone=model.shipper_phone,
-                address=model.address,
-                add_container=model.is_add_container,
-                carriage_number=model.carriage_number,
-                comment=model.comment,
-                consignee_phone=model.consignee_phone,
-                created=model.created_at,
-                container=model.container,
-                date_of_load=model.date_of_load,
-                doc=model.doc,
-                forwarder_name=model.forwarder_r.name,
-                id=model.id,
-                in_nsk=model.in_nsk,
-                product_code=model.product_code,
-                place_count=model.place_count,
-                price=model.price,
-                product=model.product,
-                updated=model.updated_at
-            ) for model in models
-        ]
-        count = await get_count(ReceiptORM, *filters, async_session=session)
-        return SReceiptQueryResult(count=count, data=schemas)
+@router.post('/query', response_model=SReceiptQueryResult)
+async def get_receipts(query: Annotated[SGetQuery, Depends()], session: ReadSessionDep) -> Response:
+    key = await result_cache.key('receipts', get_query_key(query), RECEIPT_QUERY_TABLES)
+    if (content := await result_cache.get(key)) is not None:
+        return Response(content=content, media_type='application/json')
+
+    count, rows, next_cursor = await receipt_service.query_receipts(query, session)
+    response = ORJSONResponse({'count': count, 'data': rows, 'next_cursor': next_cursor})
+    await result_cache.set(key, response.body)
+    return response
+
+
+@router.get('/query/cache')
+async def get_statement_cache_stats() -> SCacheStats:
+    return SCacheStats(hits=statement_cache.hits, misses=statement_cache.misses, size=len(statement_cache))
+
+
+@router.get('/query/result-cache')
+async def get_result_cache_stats() -> SCacheStats:
+    return SCacheStats(hits=result_cache.hits, misses=result_cache.misses, size=len(result_cache.backend))
+
+
+@router.post('/search', response_model=SReceiptQueryResult)
+async def search_receipts(query: Annotated[SGetSearchQuery, Depends()], session: ReadSessionDep) -> ORJSONResponse:
+    count, rows = await receipt_service.search_receipts(query, session)
+    return ORJSONResponse({'count': count, 'data': rows, 'next_cursor': None})
+
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _csv_lines(rows: Iterable[Iterable]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _export_lines(schemas: list[SReceipt], export_format: SGetQueryExportFormat) -> str:
+    match export_format:
+
+        case SGetQueryExportFormat.ndjson:
+            return ''.join(schema.model_dump_json() + '\n' for schema in schemas)
+
+        case SGetQueryExportFormat.csv:
+            rows = [schema.model_dump(mode='json') for schema in schemas]
+            for row in rows:
+                row['special_options'] = ';'.join(row['special_options'])
+            return _csv_lines(row.values() for row in rows)
+
+
+@router.post('/export')
+async def export_receipts(query: Annotated[SGetExportQuery, Depends()]) -> StreamingResponse:
+    stmt = (
+        select(ReceiptORM)
+        .filter(*receipt_filters(query.filters))
+        .order_by(*(get_sqlalchemy_order(ReceiptORM, q_order) for q_order in query.orders))
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    async def stream():
+        if query.format == SGetQueryExportFormat.csv:
+            yield _csv_lines([SReceipt.model_fields])
+
+        # the stream outlives the request scoped session, so it has its own. Starlette cancels this generator
+        # when the client disconnects, the session is closed shielded so the cursor and connection are released
+        session = AsyncReadSessionM()
+        try:
+            result = await session.stream_scalars(stmt)
+            async for models in result.partitions():
+                forwarders = await forwarder_cache.get_many((model.forwarder for model in models), session)
+                special_options = await get_special_options([model.id for model in models], session)
+                yield _export_lines(
+                    [
+                        receipt_schema(model, forwarders[model.forwarder]['name'], special_options[model.id])
+                        for model in models
+                    ],
+                    query.format
+                )
+        finally:
+            with anyio.CancelScope(shield=True):
+                await session.close()
+
+    media_type = 'text/csv' if query.format == SGetQueryExportFormat.csv else 'application/x-ndjson'
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="receipts.{query.format.value}"'}
+    )
 
 
 @router.post('/')
-async def add_receipt(receipt: Annotated[SReceiptAdd, Depends()]) -> SAddResult:
-    async with AsyncSessionM() as session:
-        city: CityORM = await get_if_exist(
-            CityORM(name=receipt.city, partner_name="", partner_address="", partner_phone="", is_paid_entry=False),
-            CityORM.name,
-            async_session=session
-        )
-        forwarder: ForwarderORM = await get_if_exist(
-            ForwarderORM(com_name=receipt.forwarder),
-            ForwarderORM.com_name,
-            async_session=session
-        )
-        special_options = [
-            await get_if_exist(
-                SpecialOptionORM(name=option, ordered=None),
-                SpecialOptionORM.name,
-                async_session=session
-            ) for option in receipt.special_options
-        ]
-
-        session.add(new_receipt := ReceiptORM(
-            price=receipt.price,
-            place_count=receipt.place_count,
-            weight=receipt.weight,
-            volume=receipt.volume,
-            product_code=receipt.product_code,
-            doc=receipt.doc,
-            address=receipt.address,
-            in_nsk=receipt.in_nsk,
-            shipper_fullname=receipt.shipper_fullname,
-            is_add_container=receipt.add_container,
-            shipper=receipt.shipper,
-            shipper_phone=receipt.shipper_phone,
-            consignee=receipt.consignee,
-            consignee_phone=receipt.consignee_phone,
-            product=receipt.product,
-            customer=receipt.customer,
-            container=receipt.container,
-
-            forwarder_r=forwarder,
-            city_r=city,
-            special_options_r=special_options
-        ))
-
-        await session.flush()
-        await session.commit()
-
-        return SAddResult(new_id=new_receipt.id, created=new_receipt.created_at)
-
-
-@router.get('/{receipt_id}')
-async def get_receipt(receipt_id: int) -> SReceipt:
-    result = await get_receipts(SGetQuery(filters=[
-        SGetQueryFilter(attr="id", operation=SGetQueryOperation.equality, target=receipt_id)
-    ]))
-
-    if not result.data:
-        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
-
-    else:
-        return result.data[0]
+async def add_receipt(receipt: Annotated[SReceiptAdd, Depends()], session: SessionDep) -> SAddResult:
+    new_receipt = await receipt_service.add_receipt(receipt, session)
+    return SAddResult(new_id=new_receipt.id, created=new_receipt.created_at)
+
+
+@router.post('/bulk')
+async def add_receipts(receipts: list[SReceiptAdd], session: SessionDep) -> SBulkAddResult:
+    return await receipt_service.add_receipts(list(enumerate(receipts)), [], session)
+
+
+@router.post('/bulk/csv')
+async def add_receipts_csv(file: UploadFile, session: SessionDep) -> SBulkAddResult:
+    try:
+        content = (await file.read()).decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV upload must be UTF-8 encoded")
+
+    reader = csv.DictReader(io.StringIO(content))
+    receipts, errors = [], []
+    for row, values in enumerate(reader):
+        values['special_options'] = [option for option in (values.get('special_options') or '').split(';') if option]
+        values['comment'] = values.get('comment') or None
+        try:
+            receipts.append((row, SReceiptAdd.model_validate(values)))
+        except ValidationError as e:
+            errors.append(SBulkRowError(
+                row=row,
+                detail='; '.join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            ))
+
+    return await receipt_service.add_receipts(receipts, errors, session)
+
+
+@router.post('/status')
+async def edit_receipts_status(edited: Annotated[SReceiptStatusEdit, Depends()],
+                               session: SessionDep) -> SBulkUpdateResult:
+    return await receipt_service.edit_receipts_status(edited, session)
+
+
+@router.get('/{receipt_id}', response_model=SReceipt)
+async def get_receipt(receipt_id: int, session: ReadSessionDep,
+                      if_none_match: Annotated[str | None, Header()] = None,
+                      if_modified_since: Annotated[str | None, Header()] = None) -> Response:
+    # polling clients are answered from the version alone while the receipt is unchanged
+    updated = await receipt_service.get_receipt_updated(receipt_id, session)
+    headers = validator_headers(datetime_etag(updated), updated)
+    if not_modified(headers, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+
+    return ORJSONResponse(await receipt_service.get_receipt_row(receipt_id, session), headers=headers)
 
 
 @router.patch('/{receipt_id}')
-async def edit_receipt(receipt_id: int, edited: Annotated[SReceiptEdit, Depends()]) -> SReceiptUpdateResult:
-    async with AsyncSessionM() as session:
-        query = (
-            select(ReceiptORM)
-            .options(
-                selectinload(ReceiptORM.crate_r),
-                selectinload(ReceiptORM.forwarder_r),
-                selectinload(ReceiptORM.special_options_r)
-            )
-            .filter(ReceiptORM.id == receipt_id)
-        )
-        result = await session.execute(query)
-
-        if (receipt := result.scalars().first()) is None:
-            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
-
-        if edited.shipper: receipt.shipper = edited.shipper
-        if edited.consignee: receipt.consignee = edited.consignee
-        if edited.customer: receipt.customer = edited.customer
-        if edited.shipper_fullname: receipt.shipper_fullname = edited.shipper_fullname
-        if edited.container: receipt.container = edited.container
-        if edited.doc: receipt.doc = edited.doc
-        if edited.address: receipt.address = edited.address
-        if edited.shipper_phone: receipt.shipper_phone = edited.shipper_phone
-        if edited.consignee_phone: receipt.consignee_phone = edited.consignee_phone
-        if edited.product: receipt.product = edited.product
-        if edited.place_count: receipt.place_count = edited.place_count
-        if edited.weight: receipt.weight = edited.weight
-        if edited.volume: receipt.volume = edited.volume
-        if edited.price: receipt.price = edited.price
-        if edited.product_code: receipt.product_code = edited.product_code
-        if edited.in_nsk: receipt.in_nsk = edited.in_nsk
-        if edited.add_container: receipt.add_container = edited.add_container
-        if edited.comment: receipt.comment = edited.comment
-        if edited.carriage_number: receipt.carriage_number = edited.carriage_number
-        if edited.status: receipt.status = edited.status
-        if edited.date_of_load: receipt.date_of_load = edited.date_of_load
-
-        if edited.city:
-            receipt.city_r = await get_if_exist(
-                CityORM(name=edited.city, is_paid_entry=False),
-                CityORM.name,
-                async_session=session
-            )
+async def edit_receipt(receipt_id: int, edited: Annotated[SReceiptEdit, Depends()], response: Response,
+                       session: SessionDep, if_match: Annotated[str | None, Header()] = None) -> SReceiptUpdateResult:
+    expected_updated = None
+    if if_match is not None:
+        try:
+            expected_updated = parse_if_match(if_match)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid If-Match header {if_match!r}")
+
+    receipt = await receipt_service.edit_receipt(receipt_id, edited, expected_updated, session)
+    response.headers['ETag'] = datetime_etag(receipt.updated)
+    return SReceiptUpdateResult(updated=receipt.updated, data=receipt)
+
+
+def _receipt_document_key(receipt: SReceipt) -> str:
+    # every write to the receipt, its crate or part ships moves updated, so the key changes with it
+    return document_cache.key('receipt', receipt.id, receipt.updated.isoformat(), RECEIPT_TEMPLATE_VERSION)
 
-        if edited.forwarder_com_name:
-            receipt.forwarder_r = await get_if_exist(
-                ForwarderORM(com_name=edited.forwarder_com_name),
-                ForwarderORM.com_name,
-                async_session=session
-            )
 
-        if edited.special_options:
-            receipt.special_options_r = [
-                await get_if_exist(
-                    SpecialOptionORM(name=option, ordered=None),
-                    SpecialOptionORM.name,
-                    async_session=session
-                ) for option in edited.special_options
-            ]
+def _receipt_document_name(receipt: SReceipt) -> str:
+    return f'Расписка_{receipt.id}_от_{receipt.created}.pdf'
 
-        await session.commit()
-        receipt = await get_receipt(receipt.id)
 
-        return SReceiptUpdateResult(updated=receipt.updated, data=receipt)
+async def _render_receipt(receipt: SReceipt, wait: bool = False) -> bytes:
+    key = _receipt_document_key(receipt)
+    if (pdf := await document_cache.get(key)) is None:
+        pdf = await document_pool.render(create_receipt_doc, receipt, wait=wait)
+        await document_cache.set(key, pdf)
+    return pdf
 
 
 @router.get('/{receipt_id}/pdf')
-async def get_receipt_pdf(receipt_id: int) -> FileResponse:
-    receipt = await get_receipt(receipt_id)
-    return FileResponse(
-        path=create_receipt_doc(receipt),
-        filename=f'Расписка_{receipt.id}_от_{receipt.created}.pdf',
-        media_type='multipart/form-data'
+async def get_receipt_pdf(receipt_id: int, session: ReadSessionDep,
+                          if_none_match: Annotated[str | None, Header()] = None) -> Response:
+    receipt = SReceipt.model_construct(**await receipt_service.get_receipt_row(receipt_id, session))
+    # the connection goes back to the pool instead of waiting for the render
+    await session.close()
+
+    headers = {'ETag': f'"{_receipt_document_key(receipt)}"'}
+    if etag_matches(if_none_match, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        pdf = await _render_receipt(receipt)
+    except DocumentPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '1'})
+
+    return Response(
+        content=pdf,
+        media_type='application/pdf',
+        headers=headers | {'Content-Disposition': f"attachment; filename*=utf-8''{quote(_receipt_document_name(receipt))}"}
     )
+
+
+async def _render_receipts(receipts: list[SReceipt]) -> AsyncIterator[tuple[SReceipt, bytes]]:
+    # one render per worker in flight, results come out in order so at most a window of documents is held
+    window: deque[tuple[SReceipt, asyncio.Task]] = deque()
+    try:
+        for receipt in receipts:
+            window.append((receipt, asyncio.create_task(_render_receipt(receipt, wait=True))))
+            if len(window) >= document_pool.workers:
+                receipt, task = window.popleft()
+                yield receipt, await task
+
+        while window:
+            receipt, task = window.popleft()
+            yield receipt, await task
+
+    finally:
+        for _, task in window:
+            task.cancel()
+
+
+class _ZipStream(io.RawIOBase):
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+async def _zip_documents(documents: AsyncIterator[tuple[SReceipt, bytes]]) -> AsyncIterator[bytes]:
+    # the stream isn't seekable, so zipfile writes data descriptors and every entry can be sent right away
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        async for receipt, pdf in documents:
+            archive.writestr(_receipt_document_name(receipt).replace(':', '-'), pdf)
+            yield stream.pop()
+    yield stream.pop()
+
+
+@router.post('/pdf')
+async def get_receipts_pdf(query: Annotated[SGetDocumentsQuery, Depends()],
+                           session: ReadSessionDep) -> StreamingResponse:
+    receipts = await receipt_service.get_document_receipts(query, session)
+    await session.close()
+
+    if document_pool.pending + document_pool.workers > document_pool.limit:
+        raise HTTPException(status_code=503, detail="Document pool is saturated", headers={'Retry-After': '1'})
+
+    match query.format:
+
+        case SGetQueryDocumentFormat.zip:
+            return StreamingResponse(
+                _zip_documents(_render_receipts(receipts)),
+                media_type='application/zip',
+                headers={'Content-Disposition': 'attachment; filename="receipts.zip"'}
+            )
+
+        case SGetQueryDocumentFormat.pdf:
+            # documents are spooled to disk as they come out and merged file to file by a worker,
+            # so neither this process nor the arguments sent to the worker hold the whole batch
+            directory = tempfile.TemporaryDirectory(prefix='receipts-merge-')
+            try:
+                paths = []
+                async for _, pdf in _render_receipts(receipts):
+                    paths.append(os.path.join(directory.name, f'{len(paths)}.pdf'))
+                    await anyio.Path(paths[-1]).write_bytes(pdf)
+
+                merged = os.path.join(directory.name, 'receipts.pdf')
+                await document_pool.render(merge_document_files, paths, merged, wait=True)
+            except BaseException:
+                directory.cleanup()
+                raise
+
+            return FileResponse(
+                merged,
+                media_type='application/pdf',
+                filename='receipts.pdf',
+                background=BackgroundTask(directory.cleanup)
+            )
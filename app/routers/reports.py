@@ -0,0 +1,22 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+
+from app.database import SessionDep, ReadSessionDep
+from app.schemas import SGetSummaryQuery, SSummary, SSummaryRebuildResult
+from services import reports as report_service
+
+router = APIRouter(
+    prefix='/reports',
+    tags=["Reports"]
+)
+
+
+@router.post('/summary')
+async def get_summary(query: Annotated[SGetSummaryQuery, Depends()], session: ReadSessionDep) -> list[SSummary]:
+    return await report_service.get_summary(query, session)
+
+
+@router.post('/summary/rebuild')
+async def rebuild_summary(session: SessionDep) -> SSummaryRebuildResult:
+    return SSummaryRebuildResult(groups=await report_service.rebuild_summary(session))
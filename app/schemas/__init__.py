@@ -2,3 +2,4 @@ from .queries import *
 from .results import *
 from .receipts import *
 from .crate import *
+from .reports import *
@@ -12,3 +12,7 @@ class SPartShipAdd(BaseModel):
 
 class SPartShip(SPartShipAdd):
     id: int
+
+
+class SPartShipBatchAdd(SPartShipAdd):
+    receipt_id: int
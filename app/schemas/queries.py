@@ -1,8 +1,11 @@
+import base64
 import enum
+import json
 from typing import Any
 
-from pydantic import BaseModel
-from sqlalchemy import Column
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_jsonable_python
+from sqlalchemy import Column, and_, or_, false, tuple_, bindparam
 
 from app.database import Base
 
@@ -33,37 +36,184 @@ class SGetQueryOrder(BaseModel):
     use_asc: bool = True
 
 
+class SGetQueryPagination(enum.Enum):
+    offset = 'offset'
+    cursor = 'cursor'
+
+
+class SGetQueryCount(enum.Enum):
+    exact = 'exact'
+    none = 'none'
+    estimate = 'estimate'
+    cached = 'cached'
+
+
 class SGetQuery(BaseModel):
     limit: int = 1
     offset: int = 0
+    pagination: SGetQueryPagination = SGetQueryPagination.offset
+    cursor: str | None = None
+    count: SGetQueryCount = SGetQueryCount.exact
+    fields: list[str] | None = None
+
+    filters: list[SGetQueryFilter] = []
+    orders: list[SGetQueryOrder] = []
+
+
+class SGetSearchQuery(BaseModel):
+    text: str
+    limit: int = 1
+    offset: int = 0
+    count: SGetQueryCount = SGetQueryCount.exact
+
+    filters: list[SGetQueryFilter] = []
+
+
+class SGetQueryExportFormat(enum.Enum):
+    ndjson = 'ndjson'
+    csv = 'csv'
+
+
+class SGetExportQuery(BaseModel):
+    format: SGetQueryExportFormat = SGetQueryExportFormat.ndjson
+
+    filters: list[SGetQueryFilter] = []
+    orders: list[SGetQueryOrder] = []
+
+
+class SGetQueryDocumentFormat(enum.Enum):
+    pdf = 'pdf'
+    zip = 'zip'
+
+
+class SGetDocumentsQuery(BaseModel):
+    format: SGetQueryDocumentFormat = SGetQueryDocumentFormat.pdf
 
     filters: list[SGetQueryFilter] = []
     orders: list[SGetQueryOrder] = []
 
 
-def get_sqlalchemy_filter(orm: type[Base], q_filter: SGetQueryFilter):
+def _escape_like(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def get_sqlalchemy_filter_value(q_filter: SGetQueryFilter) -> Any:
+    match q_filter.operation:
+
+        case SGetQueryOperation.like:
+            return f'%{_escape_like(q_filter.target)}%'
+
+        case SGetQueryOperation.startswith:
+            return f'{_escape_like(q_filter.target)}%'
+
+        case SGetQueryOperation.endswith:
+            return f'%{_escape_like(q_filter.target)}'
+
+        case _:
+            return q_filter.target
+
+
+def get_filter_shape(q_filter: SGetQueryFilter) -> tuple:
+    # everything that changes the SQL text of a filter; the target itself is a bound parameter
+    return q_filter.attr, q_filter.operation, q_filter.use_not, q_filter.target is None
+
+
+def get_sqlalchemy_filter(orm: type[Base], q_filter: SGetQueryFilter, param: str | None = None):
     column: Column = getattr(orm, q_filter.attr)
+    value = get_sqlalchemy_filter_value(q_filter)
+    if param is not None and value is not None:
+        value = bindparam(param, type_=column.type)
+
     match q_filter.operation:
         
         case SGetQueryOperation.equality:
-            return column != q_filter.target if q_filter.use_not else column == q_filter.target
+            return column != value if q_filter.use_not else column == value
          
         case SGetQueryOperation.less:
-            return column >= q_filter.target if q_filter.use_not else column < q_filter.target
+            return column >= value if q_filter.use_not else column < value
         
         case SGetQueryOperation.greater:
-            return column <= q_filter.target if q_filter.use_not else column > q_filter.target
-        
-        case SGetQueryOperation.like:
-            return column.notilike(f'%{q_filter.target}%') if q_filter.use_not else column.ilike(f'%{q_filter.target}%')
-        
-        case SGetQueryOperation.startswith:
-            return not column.istartswith(q_filter.target) if q_filter.use_not else column.istartswith(q_filter.target)
+            return column <= value if q_filter.use_not else column > value
+
+    # substring operations are only allowed on columns backed by a trigram index, and all of them
+    # are written as ILIKE patterns (backslash is the default escape) which that index can serve
+    if q_filter.attr not in getattr(orm, '__searchable__', ()):
+        raise ValueError(f"Attribute {q_filter.attr!r} does not support {q_filter.operation.value!r} filters")
+
+    return column.notilike(value) if q_filter.use_not else column.ilike(value)
+
+
+def get_filters_key(q_filters: list[SGetQueryFilter]) -> str:
+    # filters are ANDed, so their order does not change the result set
+    return json.dumps(sorted(json.dumps(q_filter.model_dump(mode='json'), sort_keys=True) for q_filter in q_filters))
 
-        case SGetQueryOperation.endswith:
-            return not column.iendswith(q_filter.target) if q_filter.use_not else column.iendswith(q_filter.target)
+
+def get_query_key(query: SGetQuery) -> str:
+    # requests that differ only in filter or field order select the same page
+    key = query.model_dump(mode='json', exclude={'filters', 'fields'})
+    key['filters'] = get_filters_key(query.filters)
+    key['fields'] = None if query.fields is None else sorted(set(query.fields))
+    return json.dumps(key, sort_keys=True)
 
 
 def get_sqlalchemy_order(orm: type[Base], q_order: SGetQueryOrder):
     column: Column = getattr(orm, q_order.attr)
     return column.asc() if q_order.use_asc else column.desc()
+
+
+def get_cursor_orders(q_orders: list[SGetQueryOrder]) -> list[SGetQueryOrder]:
+    if any(q_order.attr == 'id' for q_order in q_orders):
+        return q_orders
+    return [*q_orders, SGetQueryOrder(attr='id')]
+
+
+def encode_cursor(model: Base, q_orders: list[SGetQueryOrder]) -> str:
+    payload = {
+        'orders': [[q_order.attr, q_order.use_asc] for q_order in q_orders],
+        'values': [to_jsonable_python(getattr(model, q_order.attr)) for q_order in q_orders]
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(orm: type[Base], cursor: str, q_orders: list[SGetQueryOrder]) -> list[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        orders, values = payload['orders'], payload['values']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Malformed cursor")
+
+    if orders != [[q_order.attr, q_order.use_asc] for q_order in q_orders] or len(values) != len(q_orders):
+        raise ValueError("Cursor does not match query orders")
+
+    return [
+        None if value is None else TypeAdapter(getattr(orm, q_order.attr).type.python_type).validate_python(value)
+        for q_order, value in zip(q_orders, values)
+    ]
+
+
+def get_sqlalchemy_keyset(orm: type[Base], q_orders: list[SGetQueryOrder], values: list[Any]):
+    # Rows strictly after the cursor in (col_1, ..., col_n) order. Postgres puts NULLs
+    # last for ASC and first for DESC, so nullable columns need explicit branches.
+    def equal(column: Column, value: Any):
+        return column.is_(None) if value is None else column == value
+
+    def after(column: Column, value: Any, use_asc: bool):
+        if use_asc:
+            if value is None:
+                return false()
+            return or_(column > value, column.is_(None)) if column.nullable else column > value
+        else:
+            return column.is_not(None) if value is None else column < value
+
+    columns: list[Column] = [getattr(orm, q_order.attr) for q_order in q_orders]
+
+    if len({q_order.use_asc for q_order in q_orders}) == 1 and not any(column.nullable for column in columns):
+        # row-value comparison lets Postgres seek a composite index directly
+        return tuple_(*columns) > tuple_(*values) if q_orders[0].use_asc else tuple_(*columns) < tuple_(*values)
+
+    return or_(*(
+        and_(
+            *(equal(columns[j], values[j]) for j in range(i)),
+            after(columns[i], values[i], q_orders[i].use_asc)
+        ) for i in range(len(q_orders))
+    ))
@@ -2,7 +2,7 @@ import datetime
 
 from pydantic import BaseModel
 
-from app.schemas import SQueryResult, SUpdateResult
+from app.schemas import SQueryResult, SUpdateResult, SGetQueryFilter
 
 
 class SReceiptAdd(BaseModel):
@@ -74,3 +74,12 @@ class SReceiptEdit(BaseModel):
 
 class SReceiptUpdateResult(SUpdateResult):
     data: SReceipt
+
+
+class SReceiptStatusEdit(BaseModel):
+    status: str
+    carriage_number: int | None = None
+    date_of_load: datetime.date | None = None
+
+    ids: list[int] | None = None
+    filters: list[SGetQueryFilter] = []
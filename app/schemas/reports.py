@@ -0,0 +1,36 @@
+import datetime
+import enum
+
+from pydantic import BaseModel
+
+from app.schemas import SGetQueryFilter
+
+
+class SSummaryGroup(enum.Enum):
+    city = 'city'
+    forwarder = 'forwarder'
+    status = 'status'
+    date_of_load = 'date_of_load'
+
+
+class SGetSummaryQuery(BaseModel):
+    group_by: list[SSummaryGroup] = []
+    filters: list[SGetQueryFilter] = []
+
+
+class SSummary(BaseModel):
+    city: str | None = None
+    forwarder: str | None = None
+    status: str | None = None
+    date_of_load: datetime.date | None = None
+
+    receipt_count: int
+    place_count: int
+    weight: int
+    volume: float
+    price: float
+
+
+class SSummaryRebuildResult(BaseModel):
+    ok: bool = True
+    groups: int
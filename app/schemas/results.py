@@ -10,6 +10,24 @@ class SAddResult(BaseModel):
     created: datetime.datetime
 
 
+class SBulkRowError(BaseModel):
+    row: int
+    detail: str
+
+
+class SBulkAddResult(BaseModel):
+    ok: bool = True
+    new_ids: list[int]
+    errors: list[SBulkRowError] = []
+
+
+class SBulkUpdateResult(BaseModel):
+    ok: bool = True
+    updated_ids: list[int]
+    matched: int
+    rejected: int
+
+
 class SDeleteResult(BaseModel):
     ok: bool = True
     was_deleted: bool
@@ -22,5 +40,12 @@ class SUpdateResult(BaseModel):
 
 
 class SQueryResult(BaseModel):
-    count: int
+    count: int | None
     data: list[Any]
+    next_cursor: str | None = None
+
+
+class SCacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
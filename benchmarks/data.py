@@ -0,0 +1,35 @@
+import random
+
+# value pools shared by the seeder and the load driver, so generated requests look like seeded rows
+CITIES = (
+    'Новосибирск', 'Москва', 'Санкт-Петербург', 'Екатеринбург', 'Казань', 'Красноярск', 'Омск', 'Томск',
+    'Барнаул', 'Кемерово', 'Новокузнецк', 'Иркутск', 'Хабаровск', 'Владивосток', 'Якутск', 'Магадан',
+)
+SPECIAL_OPTIONS = (
+    'Хрупкое', 'Негабарит', 'Обрешётка', 'Паллет', 'Страховка', 'Температурный режим', 'Опасный груз',
+    'Срочно', 'Доставка до двери', 'Погрузчик', 'Не кантовать', 'Верх', 'Упаковка', 'Маркировка',
+)
+FIRST_NAMES = ('Иван', 'Пётр', 'Анна', 'Мария', 'Сергей', 'Олег', 'Елена', 'Дмитрий', 'Ольга', 'Алексей')
+LAST_NAMES = ('Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов')
+COMPANY_FORMS = ('ООО', 'ИП', 'АО')
+PRODUCTS = (
+    'Запчасти', 'Стройматериалы', 'Одежда', 'Продукты', 'Мебель', 'Электроника', 'Инструмент', 'Бытовая химия',
+    'Книги', 'Посуда', 'Текстиль', 'Автошины',
+)
+STREETS = ('Ленина', 'Мира', 'Советская', 'Гагарина', 'Кирова', 'Красный проспект', 'Набережная')
+
+
+def person(rnd: random.Random) -> str:
+    return f'{rnd.choice(LAST_NAMES)} {rnd.choice(FIRST_NAMES)}'
+
+
+def company(rnd: random.Random) -> str:
+    return f'{rnd.choice(COMPANY_FORMS)} {rnd.choice(LAST_NAMES)}{rnd.choice(("", " и К", " Трейд", " Групп"))}'
+
+
+def phone(rnd: random.Random) -> str:
+    return f'+79{rnd.randrange(10 ** 9):09d}'
+
+
+def forwarder(i: int) -> str:
+    return f'FWD{i:03d}'
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Awaitable
+
+import httpx
+
+from benchmarks.data import CITIES, SPECIAL_OPTIONS, PRODUCTS, STREETS, person, company, phone, forwarder
+
+Scenario = Callable[[httpx.AsyncClient, random.Random, 'Context'], Awaitable[httpx.Response]]
+
+
+class Context:
+    def __init__(self, max_id: int, forwarders: int):
+        self.max_id = max_id
+        self.forwarders = forwarders
+
+    def receipt_id(self, rnd: random.Random) -> int:
+        return rnd.randint(1, self.max_id)
+
+
+def _query(limit: int = 50, **params) -> dict:
+    return {'limit': limit} | params
+
+
+async def query_in_stock(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    # the default view of the receipts table
+    return await client.post('/receipts/query', params=_query(), json={
+        'filters': [{'attr': 'status', 'operation': 'equality', 'target': 'in_stock'}],
+        'orders': [{'attr': 'created_at', 'use_asc': False}],
+    })
+
+
+async def query_city_forwarder(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    return await client.post('/receipts/query', params=_query(offset=rnd.choice((0, 0, 50, 100))), json={
+        'filters': [
+            {'attr': 'city', 'operation': 'equality', 'target': rnd.choice(CITIES)},
+            {'attr': 'forwarder', 'operation': 'equality', 'target': forwarder(rnd.randrange(ctx.forwarders))},
+        ],
+        'orders': [{'attr': 'id', 'use_asc': False}],
+    })
+
+
+async def query_heavy_cursor(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    return await client.post('/receipts/query', params=_query(pagination='cursor', count='none'), json={
+        'filters': [{'attr': 'weight', 'operation': 'greater', 'target': rnd.randint(500, 5000)}],
+        'orders': [{'attr': 'weight', 'use_asc': False}],
+    })
+
+
+async def query_shipper_like(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    return await client.post('/receipts/query', params=_query(count='estimate'), json={
+        'filters': [{'attr': 'shipper', 'operation': 'like', 'target': person(rnd).split()[0]}],
+    })
+
+
+def _receipt_params(rnd: random.Random, ctx: Context) -> dict:
+    place_count = rnd.randint(1, 40)
+    return dict(
+        city=rnd.choice(CITIES),
+        shipper=company(rnd),
+        consignee=company(rnd),
+        customer=person(rnd),
+        forwarder=forwarder(rnd.randrange(ctx.forwarders)),
+        shipper_fullname=person(rnd),
+        container=f'BNCU{rnd.randrange(10 ** 7):07d}',
+        doc=f'ТН-{rnd.randrange(10 ** 7):07d}',
+        address=f'ул. {rnd.choice(STREETS)}, {rnd.randint(1, 200)}',
+        shipper_phone=phone(rnd),
+        consignee_phone=phone(rnd),
+        product=rnd.choice(PRODUCTS),
+        place_count=place_count,
+        weight=rnd.randint(place_count, place_count * 60),
+        volume=round(rnd.uniform(0.1, 30), 2),
+        price=round(rnd.uniform(500, 150_000), 2),
+        product_code=f'{rnd.randrange(10 ** 6):06d}',
+        in_nsk=rnd.random() < 0.8,
+        add_container=False,
+    )
+
+
+async def add_receipt(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    return await client.post(
+        '/receipts/', params=_receipt_params(rnd, ctx), json=rnd.sample(SPECIAL_OPTIONS, rnd.randint(0, 3))
+    )
+
+
+async def edit_receipt(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    return await client.patch(f'/receipts/{ctx.receipt_id(rnd)}', params={
+        'comment': rnd.choice(('Позвонить перед доставкой', 'Оплата получателем')),
+        'consignee_phone': phone(rnd),
+    })
+
+
+async def add_part_ship(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    # empty part ships leave the seeded totals as they are, the statements are the same
+    return await client.post(f'/receipts/{ctx.receipt_id(rnd)}/part-ships/', params={
+        'date': datetime.date.today().isoformat(), 'place_count': 0, 'weight': 0, 'volume': 0,
+    })
+
+
+async def get_receipt_pdf(client: httpx.AsyncClient, rnd: random.Random, ctx: Context) -> httpx.Response:
+    return await client.get(f'/receipts/{ctx.receipt_id(rnd)}/pdf')
+
+
+SCENARIOS: dict[str, Scenario] = {
+    'query_in_stock': query_in_stock,
+    'query_city_forwarder': query_city_forwarder,
+    'query_heavy_cursor': query_heavy_cursor,
+    'query_shipper_like': query_shipper_like,
+    'add_receipt': add_receipt,
+    'edit_receipt': edit_receipt,
+    'add_part_ship': add_part_ship,
+    'get_receipt_pdf': get_receipt_pdf,
+}
+
+
+async def _max_receipt_id(client: httpx.AsyncClient) -> int:
+    response = await client.post('/receipts/query', params={'limit': 1, 'count': 'none'}, json={
+        'fields': ['id'], 'orders': [{'attr': 'id', 'use_asc': False}],
+    })
+    response.raise_for_status()
+    if not (data := response.json()['data']):
+        sys.exit('No receipts found, run benchmarks.seed first')
+    return data[0]['id']
+
+
+def _percentile(quantiles: list[float], p: int) -> float:
+    return round(quantiles[p - 1] * 1000, 2)
+
+
+async def _drive(client: httpx.AsyncClient, scenario: Scenario, ctx: Context, requests: int, concurrency: int,
+                 seed_value: int) -> tuple[list[float], int, float]:
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+
+    async def worker(rnd: random.Random):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await scenario(client, rnd, ctx)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(seed_value + i)) for i in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, ctx: Context, requests: int,
+                       concurrency: int, seed_value: int) -> dict:
+    latencies, errors, elapsed = await _drive(client, scenario, ctx, max(requests, 2), concurrency, seed_value)
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'p50_ms': _percentile(quantiles, 50),
+        'p95_ms': _percentile(quantiles, 95),
+        'p99_ms': _percentile(quantiles, 99),
+    }
+
+
+def compare(results: dict, baseline: dict) -> float:
+    # prints the change of every metric and returns the worst p95 regression in percent
+    worst = 0.0
+    print(f"{'scenario':<24}{'metric':<12}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current in results['scenarios'].items():
+        if (previous := baseline['scenarios'].get(name)) is None:
+            continue
+        for metric in ('throughput', 'p50_ms', 'p95_ms', 'p99_ms'):
+            change = (current[metric] - previous[metric]) / previous[metric] * 100 if previous[metric] else 0.0
+            print(f'{name:<24}{metric:<12}{previous[metric]:>12}{current[metric]:>12}{change:>+9.1f}%')
+            if metric == 'p95_ms':
+                worst = max(worst, change)
+    return worst
+
+
+async def run(args: argparse.Namespace) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        ctx = Context(await _max_receipt_id(client), args.forwarders)
+        scenarios = {}
+        for name in args.scenarios:
+            # a short warmup so statement, reference and connection caches don't skew the first requests
+            await _drive(client, SCENARIOS[name], ctx, args.warmup, args.concurrency, args.seed)
+            scenarios[name] = await run_scenario(
+                client, SCENARIOS[name], ctx, args.requests, args.concurrency, args.seed
+            )
+            print(f'{name:<24}' + '  '.join(f'{key}={value}' for key, value in scenarios[name].items()), flush=True)
+
+    return {
+        'started': datetime.datetime.now().isoformat(timespec='seconds'),
+        'base_url': args.base_url,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'seed': args.seed,
+        'scenarios': scenarios,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure latency and throughput of a running server')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=1000, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=50, help='untimed requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--forwarders', type=int, default=50, help='as passed to benchmarks.seed')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    parser.add_argument('--max-regression', type=float,
+                        help='exit with an error when a p95 got slower than the baseline by this many percent')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            worst = compare(results, json.load(file))
+        if args.max_regression is not None and worst > args.max_regression:
+            sys.exit(f'p95 regressed by {worst:.1f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import datetime
+import random
+import time
+
+from sqlalchemy import text, select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+
+from app.database import DATABASE_URL, ReceiptORM, CityORM, ForwarderORM, SpecialOptionORM, CrateORM, PartShipORM, \
+    SpecialOptionReceiptORM, StatusEnum
+from benchmarks.data import CITIES, SPECIAL_OPTIONS, PRODUCTS, STREETS, person, company, phone, forwarder
+
+
+# share of receipts per status, in stock dominates as in production
+STATUS_WEIGHTS = {StatusEnum.in_stock: 70, StatusEnum.shipped: 27, StatusEnum.refund: 3}
+
+RECEIPT_COLUMNS = (
+    'id', 'created_at', 'updated_at', 'price', 'place_count', 'weight', 'volume', 'product_code', 'doc', 'address',
+    'in_nsk', 'shipper_fullname', 'is_add_container', 'status', 'carriage_number', 'date_of_load', 'shipper',
+    'shipper_phone', 'consignee', 'consignee_phone', 'customer', 'container', 'product', 'comment', 'city',
+    'forwarder',
+)
+
+
+def _forwarders(count: int) -> list[dict]:
+    return [
+        dict(com_name=forwarder(i), name=f'ТК Перевозчик {i}', phone=f'+7383{i:07d}', address='', site='')
+        for i in range(count)
+    ]
+
+
+def _receipt(rnd: random.Random, receipt_id: int, forwarders: list[str], now: datetime.datetime) -> tuple:
+    status = rnd.choices(tuple(STATUS_WEIGHTS), tuple(STATUS_WEIGHTS.values()))[0]
+    created = now - datetime.timedelta(seconds=rnd.randrange(2 * 365 * 24 * 3600))
+    updated = created + datetime.timedelta(seconds=rnd.randrange(30 * 24 * 3600))
+    shipped = status != StatusEnum.in_stock
+    place_count = rnd.randint(1, 40)
+    return (
+        receipt_id,
+        created,
+        min(updated, now),
+        round(rnd.uniform(500, 150_000), 2),
+        place_count,
+        rnd.randint(place_count, min(place_count * 60, 30_000)),
+        round(rnd.uniform(0.1, 30), 2),
+        f'{rnd.randrange(10 ** 6):06d}',
+        f'ТН-{rnd.randrange(10 ** 7):07d}',
+        f'ул. {rnd.choice(STREETS)}, {rnd.randint(1, 200)}',
+        rnd.random() < 0.8,
+        person(rnd),
+        rnd.random() < 0.1,
+        status.name,
+        rnd.randint(1, 300) if shipped else None,
+        (created + datetime.timedelta(days=rnd.randint(1, 20))).date() if shipped else None,
+        company(rnd),
+        phone(rnd),
+        company(rnd),
+        phone(rnd),
+        person(rnd),
+        f'{"".join(rnd.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=3))}U{rnd.randrange(10 ** 7):07d}',
+        rnd.choice(PRODUCTS),
+        rnd.choice((None, None, None, 'Позвонить перед доставкой', 'Оплата получателем', 'Сверить количество')),
+        rnd.choice(CITIES),
+        rnd.choice(forwarders),
+    )
+
+
+async def _seed_references(conn: AsyncConnection, forwarders: int) -> tuple[list[str], list[int]]:
+    await conn.execute(insert(CityORM).on_conflict_do_nothing(), [
+        dict(name=city, partner_name=person(random.Random(city)), partner_address='', partner_phone='',
+             is_paid_entry=False)
+        for city in CITIES
+    ])
+    await conn.execute(insert(ForwarderORM).on_conflict_do_nothing(), _forwarders(forwarders))
+    await conn.execute(insert(SpecialOptionORM).on_conflict_do_nothing(), [
+        dict(name=name, ordered=i) for i, name in enumerate(SPECIAL_OPTIONS)
+    ])
+    forwarder_names = (await conn.scalars(select(ForwarderORM.com_name).order_by(ForwarderORM.com_name))).all()
+    option_ids = (await conn.scalars(
+        select(SpecialOptionORM.id).filter(SpecialOptionORM.name.in_(SPECIAL_OPTIONS)).order_by(SpecialOptionORM.id)
+    )).all()
+    return list(forwarder_names), list(option_ids)
+
+
+async def _copy(conn: AsyncConnection, table: str, columns: tuple[str, ...], records: list[tuple]):
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(table, records=records, columns=columns)
+
+
+async def _reset_sequences(conn: AsyncConnection):
+    for model in (ReceiptORM, PartShipORM):
+        table = model.__tablename__
+        await conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"coalesce((SELECT max(id) FROM \"{table}\"), 0) + 1, false)"
+        ))
+
+
+async def seed(url: str, receipts: int, batch_size: int, forwarders: int, seed_value: int, truncate: bool):
+    rnd = random.Random(seed_value)
+    now = datetime.datetime(2024, 6, 1)
+    engine = create_async_engine(url)
+
+    async with engine.begin() as conn:
+        if truncate:
+            await conn.execute(text(
+                'TRUNCATE "ReceiptORM", "CrateORM", "PartShipORM", "ReceiptSummaryORM", '
+                f'{SpecialOptionReceiptORM.name} RESTART IDENTITY CASCADE'
+            ))
+        forwarder_names, option_ids = await _seed_references(conn, forwarders)
+        first_id = (await conn.scalar(select(func.coalesce(func.max(ReceiptORM.id), 0)))) + 1
+        part_ship_id = (await conn.scalar(select(func.coalesce(func.max(PartShipORM.id), 0)))) + 1
+
+    started = time.perf_counter()
+    for start in range(first_id, first_id + receipts, batch_size):
+        rows = [
+            _receipt(rnd, receipt_id, forwarder_names, now)
+            for receipt_id in range(start, min(start + batch_size, first_id + receipts))
+        ]
+        links, crates, part_ships = [], [], []
+        for row in rows:
+            receipt_id, created, place_count, weight, volume = row[0], row[1], row[4], row[5], row[6]
+            links.extend((receipt_id, option_id) for option_id in rnd.sample(option_ids, rnd.choice((0, 0, 1, 1, 2, 3))))
+
+            if rnd.random() < 0.05:
+                crates.append((receipt_id, created, created, min(weight, 32_767), max(int(volume), 1)))
+
+            if place_count > 1 and rnd.random() < 0.1:
+                for _ in range(rnd.randint(1, 3)):
+                    part_ships.append((
+                        part_ship_id, created, created, receipt_id,
+                        (created + datetime.timedelta(days=rnd.randint(1, 30))).date(),
+                        1, max(weight // place_count, 1), round(volume / place_count, 2)
+                    ))
+                    part_ship_id += 1
+
+        async with engine.begin() as conn:
+            await _copy(conn, ReceiptORM.__tablename__, RECEIPT_COLUMNS, rows)
+            await _copy(conn, SpecialOptionReceiptORM.name, ('left_id', 'right_id'), links)
+            await _copy(conn, CrateORM.__tablename__,
+                        ('receipt_id', 'created_at', 'updated_at', 'old_weight', 'old_volume'), crates)
+            await _copy(conn, PartShipORM.__tablename__,
+                        ('id', 'created_at', 'updated_at', 'receipt_id', 'date', 'place_count', 'weight', 'volume'),
+                        part_ships)
+
+        done = rows[-1][0] - first_id + 1
+        print(f'{done}/{receipts} receipts, {done / (time.perf_counter() - started):.0f} rows/s', flush=True)
+
+    async with engine.begin() as conn:
+        await _reset_sequences(conn)
+    # planner statistics for the new rows, outside of a transaction block
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('ANALYZE'))
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk load synthetic receipts into a local database')
+    parser.add_argument('--url', default=DATABASE_URL)
+    parser.add_argument('--receipts', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=50_000)
+    parser.add_argument('--forwarders', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--truncate', action='store_true', help='remove existing receipts first')
+    args = parser.parse_args()
+
+    asyncio.run(seed(args.url, args.receipts, args.batch_size, args.forwarders, args.seed, args.truncate))
+
+
+if __name__ == '__main__':
+    main()
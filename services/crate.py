@@ -0,0 +1,59 @@
+import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.database import CrateORM, ReceiptORM
+from app.schemas import SSetCrate
+
+
+async def get_receipt_with_crate(receipt_id: int, session: AsyncSession) -> ReceiptORM:
+    query = (select(ReceiptORM).options(selectinload(ReceiptORM.crate_r))
+             .filter(ReceiptORM.id == receipt_id))
+    result = await session.execute(query)
+
+    if (receipt := result.scalars().first()) is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    return receipt
+
+
+async def get_crate_updated(receipt_id: int, session: AsyncSession) -> datetime.datetime:
+    # a deleted crate leaves no row, but the delete moved the receipt version
+    query = (
+        select(func.coalesce(CrateORM.updated_at, ReceiptORM.updated_at))
+        .select_from(ReceiptORM)
+        .outerjoin(CrateORM, CrateORM.receipt_id == ReceiptORM.id)
+        .filter(ReceiptORM.id == receipt_id)
+    )
+    if (updated := await session.scalar(query)) is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    return updated
+
+
+async def set_crate(receipt_id: int, crate: SSetCrate, session: AsyncSession) -> CrateORM:
+    receipt = await get_receipt_with_crate(receipt_id, session)
+    if receipt.crate_r is None:
+        receipt.crate_r = CrateORM(old_volume=receipt.volume, old_weight=receipt.weight)
+
+    receipt.volume = crate.new_volume
+    receipt.weight = crate.new_wight
+    receipt.updated_at = func.now()
+
+    await session.flush()
+    return receipt.crate_r
+
+
+async def delete_crate(receipt_id: int, session: AsyncSession) -> bool:
+    query = (select(CrateORM).filter(CrateORM.receipt_id == receipt_id))
+    result = await session.execute(query)
+
+    if (crate := result.scalars().first()) is None:
+        return False
+
+    await session.delete(crate)
+    await session.execute(
+        update(ReceiptORM).filter(ReceiptORM.id == receipt_id).values(updated_at=func.now())
+    )
+    return True
@@ -1,9 +1,14 @@
+import os
+
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
 from .receipt import create_receipt_doc
 
 
-pdfmetrics.registerFont(TTFont("OpenSans", 'services/documents/OpenSans.ttf'))
-pdfmetrics.registerFont(TTFont("OpenSansBold", 'services/documents/OpenSans-Bold.ttf'))
+FONTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
+def register_fonts():
+    pdfmetrics.registerFont(TTFont("OpenSans", os.path.join(FONTS_DIR, 'OpenSans.ttf')))
+    pdfmetrics.registerFont(TTFont("OpenSansBold", os.path.join(FONTS_DIR, 'OpenSans-Bold.ttf')))
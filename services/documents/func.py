@@ -1,2 +1,12 @@
+from pypdf import PdfWriter
+
+
 def col_width(page_width: int, *k: float):
     return [page_width * k_ for k_ in k]
+
+
+def merge_document_files(paths: list[str], output: str):
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    writer.write(output)
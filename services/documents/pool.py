@@ -0,0 +1,54 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Any, TypeVar
+
+from app.config import settings
+from . import register_fonts
+
+T = TypeVar('T')
+
+
+class DocumentPoolBusy(Exception):
+    pass
+
+
+# ReportLab rendering is CPU bound, so documents are built in worker processes that register
+# the fonts once on start. Renders beyond the workers plus the queue are rejected right away,
+# unless the caller asks to wait, as batches that already bound their own concurrency do.
+class DocumentPool:
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.pending = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=register_fonts
+            )
+        return self._executor
+
+    async def render(self, func: Callable[..., T], *args: Any, wait: bool = False) -> T:
+        if not wait and self.pending >= self.limit:
+            raise DocumentPoolBusy(f"Document pool is saturated ({self.pending} renders pending)")
+
+        self.pending += 1
+        try:
+            async with self._slots:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+document_pool = DocumentPool(settings.PDF_WORKERS, settings.PDF_QUEUE_SIZE)
@@ -1,3 +1,5 @@
+import io
+
 from reportlab.lib.enums import TA_RIGHT
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import ParagraphStyle
@@ -6,16 +8,19 @@ from reportlab.platypus import SimpleDocTemplate, Table, Paragraph
 from app.schemas import SReceipt
 from services.documents.func import col_width
 
+# bump on any layout change, cached documents are keyed by it
+TEMPLATE_VERSION = 1
+
 MARGIN = 10
 FONT_SIZE = 11
 LEADING = 14
 SPACE_AFTER = 10
 
 
-def create_receipt_doc(receipt: SReceipt):
-    pdf_path = f'services/documents/temp/receipt{receipt.id}.pdf'
+def create_receipt_doc(receipt: SReceipt) -> bytes:
+    buffer = io.BytesIO()
     pdf = SimpleDocTemplate(
-        pdf_path,
+        buffer,
         pagesize=A4,
         leftMargin=MARGIN,
         rightMargin=MARGIN,
@@ -44,4 +49,4 @@ def create_receipt_doc(receipt: SReceipt):
 
     pdf.build(story)
 
-    return pdf_path
+    return buffer.getvalue()
@@ -0,0 +1,144 @@
+import datetime
+from collections import defaultdict
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, insert, delete, literal, bindparam, Row, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.database import ReceiptORM, PartShipORM
+from app.cache import mark_written
+from app.schemas.part_ships import SPartShipAdd, SPartShipBatchAdd
+
+
+async def get_part_ships(receipt_id: int, session: AsyncSession) -> list[PartShipORM]:
+    query = (select(ReceiptORM).options(selectinload(ReceiptORM.part_ships_r))
+             .filter(ReceiptORM.id == receipt_id))
+    result = await session.execute(query)
+
+    if (receipt := result.scalars().first()) is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    return receipt.part_ships_r
+
+
+async def get_part_ships_version(receipt_id: int, session: AsyncSession) -> tuple[int, datetime.datetime]:
+    # every part ship write moves the receipt version too, so deletes are seen as well
+    query = (
+        select(
+            func.count(PartShipORM.id),
+            func.greatest(ReceiptORM.updated_at, func.max(PartShipORM.updated_at)),
+        )
+        .select_from(ReceiptORM)
+        .outerjoin(PartShipORM, PartShipORM.receipt_id == ReceiptORM.id)
+        .filter(ReceiptORM.id == receipt_id)
+        .group_by(ReceiptORM.id)
+    )
+    if (row := (await session.execute(query)).first()) is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    return row[0], row[1]
+
+
+def _add_to_totals(place_count, weight, volume) -> dict:
+    return dict(
+        place_count=ReceiptORM.place_count + place_count,
+        weight=ReceiptORM.weight + weight,
+        volume=ReceiptORM.volume + volume,
+        updated_at=func.now()
+    )
+
+
+async def add_part_ship(receipt_id: int, part_ship: SPartShipAdd, session: AsyncSession) -> Row:
+    # totals are decremented in SQL, concurrent part ships of one receipt can't overwrite each other
+    receipt = (
+        update(ReceiptORM)
+        .filter(ReceiptORM.id == receipt_id)
+        .values(_add_to_totals(-part_ship.place_count, -part_ship.weight, -part_ship.volume))
+        .returning(ReceiptORM.id)
+        .cte('receipt')
+    )
+    stmt = (
+        insert(PartShipORM)
+        .from_select(
+            ['receipt_id', 'date', 'place_count', 'weight', 'volume'],
+            select(
+                receipt.c.id,
+                literal(part_ship.date, PartShipORM.date.type),
+                literal(part_ship.place_count, PartShipORM.place_count.type),
+                literal(part_ship.weight, PartShipORM.weight.type),
+                literal(part_ship.volume, PartShipORM.volume.type),
+            )
+        )
+        .add_cte(receipt)
+        .returning(PartShipORM.id, PartShipORM.created_at)
+    )
+
+    result = await session.execute(stmt)
+    mark_written(session, ReceiptORM)
+
+    if (row := result.first()) is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    return row
+
+
+async def delete_part_ship(receipt_id: int, part_ship_id: int, session: AsyncSession) -> bool:
+    # the deleted part ship is added back to the receipt totals in the same statement
+    deleted = (
+        delete(PartShipORM)
+        .filter(PartShipORM.id == part_ship_id, PartShipORM.receipt_id == receipt_id)
+        .returning(PartShipORM.receipt_id, PartShipORM.place_count, PartShipORM.weight, PartShipORM.volume)
+        .cte('deleted')
+    )
+    stmt = (
+        update(ReceiptORM)
+        .filter(ReceiptORM.id == deleted.c.receipt_id)
+        .values(_add_to_totals(deleted.c.place_count, deleted.c.weight, deleted.c.volume))
+        .returning(ReceiptORM.id)
+        .execution_options(synchronize_session=False)
+    )
+
+    result = await session.execute(stmt)
+    mark_written(session, PartShipORM)
+
+    if result.first() is None:
+        if await session.scalar(select(ReceiptORM.id).filter(ReceiptORM.id == receipt_id)) is None:
+            raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+        return False
+    return True
+
+
+async def add_part_ships(part_ships: list[SPartShipBatchAdd], session: AsyncSession) -> list[int]:
+    if not part_ships:
+        return []
+
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for part_ship in part_ships:
+        total = totals[part_ship.receipt_id]
+        total[0] += part_ship.place_count
+        total[1] += part_ship.weight
+        total[2] += part_ship.volume
+
+    # receipts are locked in id order, so overlapping batches can't deadlock each other
+    locked = await session.scalars(
+        select(ReceiptORM.id).filter(ReceiptORM.id.in_(totals)).order_by(ReceiptORM.id).with_for_update()
+    )
+    if missing := totals.keys() - set(locked):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Receipts with id={', '.join(map(str, sorted(missing)))} not found"
+        )
+
+    await session.execute(
+        update(ReceiptORM.__table__)
+        .filter(ReceiptORM.id == bindparam('receipt_id'))
+        .values(_add_to_totals(bindparam('delta_place_count'), bindparam('delta_weight'), bindparam('delta_volume'))),
+        [
+            dict(receipt_id=receipt_id, delta_place_count=-place_count, delta_weight=-weight, delta_volume=-volume)
+            for receipt_id, (place_count, weight, volume) in sorted(totals.items())
+        ]
+    )
+
+    new_ids = await session.scalars(
+        insert(PartShipORM).returning(PartShipORM.id, sort_by_parameter_order=True),
+        [part_ship.model_dump() for part_ship in part_ships]
+    )
+    return list(new_ids)
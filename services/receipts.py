@@ -0,0 +1,540 @@
+import datetime
+import json
+from operator import attrgetter
+from typing import Iterable, Any, NoReturn
+
+from fastapi import HTTPException
+from sqlalchemy import select, insert, update, delete, func, Select, bindparam, String, Row, cast, literal
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.config import settings
+from app.database import ReceiptORM, CityORM, SpecialOptionORM, ForwarderORM, SpecialOptionReceiptORM, \
+    CrateORM, PartShipORM, SEARCH_CONFIG, StatusEnum
+from app.cache import LRUCache, table_versions, city_cache, forwarder_cache, special_option_cache, StatementCache, \
+    mark_written
+from app.database.core import get_count, get_estimated_count
+from app.schemas import SReceipt, SGetQuery, get_sqlalchemy_filter, get_sqlalchemy_order, SReceiptAdd, \
+    SGetQueryFilter, SGetQueryOperation, SReceiptEdit, SGetQueryPagination, get_cursor_orders, \
+    get_sqlalchemy_keyset, encode_cursor, decode_cursor, SGetQueryCount, get_filters_key, SBulkAddResult, \
+    SBulkRowError, SGetSearchQuery, get_filter_shape, get_sqlalchemy_filter_value, SGetQueryOrder, \
+    SGetDocumentsQuery, SGetQueryDocumentFormat, SReceiptStatusEdit, SBulkUpdateResult
+
+
+RECEIPT_FIELDS = tuple(SReceipt.model_fields)
+RECEIPT_FIELD_COLUMNS = {
+    'add_container': 'is_add_container',
+    'created': 'created_at',
+    'updated': 'updated_at',
+    'forwarder_name': 'forwarder',
+}
+RECEIPT_FIELD_GETTERS = {
+    field: attrgetter(RECEIPT_FIELD_COLUMNS.get(field, field))
+    for field in RECEIPT_FIELDS if field not in ('forwarder_name', 'special_options')
+} | {'status': lambda model: str(model.status.value)}
+
+
+def receipt_row(model: ReceiptORM, forwarder_name: str | None, special_options: list[str] | None,
+                fields: Iterable[str] = RECEIPT_FIELDS) -> dict[str, Any]:
+    # plain dict in SReceipt field order, serialized by orjson without a pydantic round trip
+    values = {'forwarder_name': forwarder_name, 'special_options': special_options}
+    return {field: values[field] if field in values else RECEIPT_FIELD_GETTERS[field](model) for field in fields}
+
+
+def receipt_schema(model: ReceiptORM, forwarder_name: str | None, special_options: list[str]) -> SReceipt:
+    return SReceipt.model_construct(**receipt_row(model, forwarder_name, special_options))
+
+
+def receipt_filters(q_filters: list[SGetQueryFilter], bind: bool = False) -> list:
+    try:
+        return [
+            get_sqlalchemy_filter(ReceiptORM, q_filter, f'filter_{i}' if bind else None)
+            for i, q_filter in enumerate(q_filters)
+        ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _receipt_filter_params(q_filters: list[SGetQueryFilter]) -> dict[str, Any]:
+    return {
+        f'filter_{i}': value for i, q_filter in enumerate(q_filters)
+        if (value := get_sqlalchemy_filter_value(q_filter)) is not None
+    }
+
+
+statement_cache = StatementCache(maxsize=256)
+count_cache = LRUCache(maxsize=1024, ttl=settings.COUNT_CACHE_TTL)
+# everything a query page is read from or derived from; a write to any of them invalidates cached pages
+RECEIPT_QUERY_TABLES = (
+    ReceiptORM.__tablename__, ForwarderORM.__tablename__, SpecialOptionORM.__tablename__,
+    SpecialOptionReceiptORM.name, CrateORM.__tablename__, PartShipORM.__tablename__
+)
+
+
+async def _count_receipts(q_count: SGetQueryCount, filters: list, params: dict[str, Any], filters_key: str,
+                          session: AsyncSession) -> int | None:
+    match q_count:
+
+        case SGetQueryCount.none:
+            return None
+
+        case SGetQueryCount.cached:
+            key = (filters_key, table_versions.get(ReceiptORM))
+            if (count := count_cache.get(key)) is None:
+                count = await _count_receipts(SGetQueryCount.exact, filters, params, filters_key, session)
+                count_cache.set(key, count)
+            return count
+
+        case SGetQueryCount.estimate:
+            return await get_estimated_count(ReceiptORM, *filters, async_session=session, params=params)
+
+        case SGetQueryCount.exact:
+            return await get_count(ReceiptORM, *filters, async_session=session, params=params)
+
+
+def receipt_select(fields: Iterable[str], orders: Iterable[SGetQueryOrder] = (),
+                   receipt: type[ReceiptORM] = ReceiptORM) -> Select:
+    # one statement per page: the forwarder name is joined and special options are aggregated in place
+    columns = {}
+    for field in fields:
+        match field:
+
+            case 'forwarder_name':
+                columns[field] = ForwarderORM.name
+
+            case 'special_options':
+                columns[field] = (
+                    select(func.coalesce(func.array_agg(SpecialOptionORM.name), cast(literal('{}'), ARRAY(String))))
+                    .join(SpecialOptionReceiptORM, SpecialOptionReceiptORM.c.right_id == SpecialOptionORM.id)
+                    .filter(SpecialOptionReceiptORM.c.left_id == receipt.id)
+                    .scalar_subquery()
+                )
+
+            case _:
+                columns[field] = getattr(receipt, RECEIPT_FIELD_COLUMNS.get(field, field))
+
+    # order columns are selected too, the next cursor is encoded from the last row
+    for q_order in orders:
+        columns.setdefault(q_order.attr, getattr(receipt, q_order.attr))
+
+    stmt = select(*(column.label(label) for label, column in columns.items())).select_from(receipt)
+    if 'forwarder_name' in fields:
+        stmt = stmt.outerjoin(ForwarderORM, ForwarderORM.com_name == receipt.forwarder)
+    return stmt
+
+
+def receipt_mapping_rows(rows: Iterable[Row], fields: Iterable[str] = RECEIPT_FIELDS) -> list[dict[str, Any]]:
+    data = [{field: row[field] for field in fields} for row in (row._mapping for row in rows)]
+    if 'status' in fields:
+        for item in data:
+            item['status'] = str(item['status'].value)
+    return data
+
+
+def _receipt_fields(q_fields: list[str] | None) -> tuple[str, ...]:
+    if q_fields is None:
+        return RECEIPT_FIELDS
+
+    if unknown := set(q_fields).difference(RECEIPT_FIELDS):
+        raise HTTPException(status_code=400, detail=f"Unknown receipt fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in RECEIPT_FIELDS if field in q_fields)
+
+
+async def query_receipts(query: SGetQuery,
+                         session: AsyncSession) -> tuple[int | None, list[dict[str, Any]], str | None]:
+    use_cursor = query.pagination == SGetQueryPagination.cursor
+    if query.limit < 0 or query.offset < 0:
+        raise HTTPException(status_code=400, detail="limit and offset must not be negative")
+    if use_cursor and query.limit == 0:
+        raise HTTPException(status_code=400, detail="Cursor pagination needs a positive limit")
+    orders = get_cursor_orders(query.orders) if use_cursor else query.orders
+
+    fields = _receipt_fields(query.fields)
+
+    cursor_values = None
+    if use_cursor and query.cursor is not None:
+        try:
+            cursor_values = decode_cursor(ReceiptORM, query.cursor, orders)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # statements are cached by shape, filter targets, cursor values and paging go in as parameters
+    filters_shape = tuple(get_filter_shape(q_filter) for q_filter in query.filters)
+    filters = statement_cache.get(('filters', filters_shape), lambda: receipt_filters(query.filters, bind=True))
+    filter_params = _receipt_filter_params(query.filters)
+
+    # the exact total comes with the page: a window over the same statement with offset pagination, a
+    # subquery over the filters alone with cursors, where the keyset predicate would shrink the window
+    count_in_page = query.count == SGetQueryCount.exact
+
+    def build() -> Select:
+        stmt = (
+            receipt_select(fields, orders)
+            .filter(*filters)
+            .order_by(*(get_sqlalchemy_order(ReceiptORM, q_order) for q_order in orders))
+        )
+        if count_in_page and use_cursor:
+            stmt = stmt.add_columns(
+                select(func.count(ReceiptORM.id)).filter(*filters).correlate(None).scalar_subquery()
+                .label('total_count')
+            )
+        elif count_in_page:
+            stmt = stmt.add_columns(func.count().over().label('total_count'))
+
+        if not use_cursor:
+            return stmt.limit(bindparam('limit')).offset(bindparam('offset'))
+
+        if cursor_values is not None:
+            stmt = stmt.filter(get_sqlalchemy_keyset(ReceiptORM, orders, [
+                None if value is None else bindparam(f'cursor_{i}', type_=getattr(ReceiptORM, q_order.attr).type)
+                for i, (q_order, value) in enumerate(zip(orders, cursor_values))
+            ]))
+        return stmt.limit(bindparam('limit'))
+
+    stmt = statement_cache.get((
+        'query',
+        fields,
+        filters_shape,
+        tuple((q_order.attr, q_order.use_asc) for q_order in orders),
+        use_cursor,
+        count_in_page,
+        cursor_values and tuple(value is None for value in cursor_values),
+    ), build)
+
+    if use_cursor:
+        params = filter_params | {'limit': query.limit + 1} | {
+            f'cursor_{i}': value for i, value in enumerate(cursor_values or ()) if value is not None
+        }
+    else:
+        params = filter_params | {'limit': query.limit, 'offset': query.offset}
+
+    rows = list((await session.execute(stmt, params)).all())
+    if not count_in_page:
+        count = await _count_receipts(query.count, filters, filter_params, get_filters_key(query.filters), session)
+    elif rows:
+        count = rows[0].total_count
+    elif query.limit and (cursor_values is None if use_cursor else not query.offset):
+        # an empty first page means the filter matched nothing
+        count = 0
+    else:
+        # an empty page past the end or of no rows at all says nothing about the total
+        count = await _count_receipts(query.count, filters, filter_params, get_filters_key(query.filters), session)
+
+    next_cursor = None
+    if use_cursor and len(rows) > query.limit:
+        rows = rows[:query.limit]
+        next_cursor = encode_cursor(rows[-1], orders)
+
+    return count, receipt_mapping_rows(rows, fields), next_cursor
+
+
+async def search_receipts(query: SGetSearchQuery, session: AsyncSession) -> tuple[int | None, list[dict[str, Any]]]:
+    filters_shape = tuple(get_filter_shape(q_filter) for q_filter in query.filters)
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, bindparam('text', type_=String))
+
+    filters = statement_cache.get(('search_filters', filters_shape), lambda: [
+        ReceiptORM.search_vector.bool_op('@@')(ts_query),
+        *receipt_filters(query.filters, bind=True)
+    ])
+    filter_params = _receipt_filter_params(query.filters) | {'text': query.text}
+
+    # as with query_receipts, the exact total is a window over the page statement
+    count_in_page = query.count == SGetQueryCount.exact
+
+    def build() -> Select:
+        stmt = (
+            receipt_select(RECEIPT_FIELDS)
+            .filter(*filters)
+            .order_by(func.ts_rank(ReceiptORM.search_vector, ts_query).desc(), ReceiptORM.id)
+            .limit(bindparam('limit')).offset(bindparam('offset'))
+        )
+        return stmt.add_columns(func.count().over().label('total_count')) if count_in_page else stmt
+
+    stmt = statement_cache.get(('search', filters_shape, count_in_page), build)
+    rows = list((await session.execute(stmt, filter_params | {'limit': query.limit, 'offset': query.offset})).all())
+
+    if count_in_page and rows:
+        count = rows[0].total_count
+    elif count_in_page and query.limit and not query.offset:
+        count = 0
+    else:
+        count = await _count_receipts(
+            query.count, filters, filter_params, json.dumps([query.text, get_filters_key(query.filters)]), session
+        )
+    return count, receipt_mapping_rows(rows)
+
+
+async def get_special_options(receipt_ids: list[int], session: AsyncSession) -> dict[int, list[str]]:
+    # selectinload of a many-to-many collection can't be combined with yield_per
+    stmt = (
+        select(SpecialOptionReceiptORM.c.left_id, SpecialOptionORM.name)
+        .join(SpecialOptionORM, SpecialOptionORM.id == SpecialOptionReceiptORM.c.right_id)
+        .filter(SpecialOptionReceiptORM.c.left_id.in_(receipt_ids))
+    )
+    result = await session.execute(stmt)
+    special_options = {receipt_id: [] for receipt_id in receipt_ids}
+    for receipt_id, name in result:
+        special_options[receipt_id].append(name)
+    return special_options
+
+
+def _receipt_values(receipt: SReceiptAdd) -> dict[str, Any]:
+    return dict(
+        price=receipt.price,
+        place_count=receipt.place_count,
+        weight=receipt.weight,
+        volume=receipt.volume,
+        product_code=receipt.product_code,
+        doc=receipt.doc,
+        address=receipt.address,
+        in_nsk=receipt.in_nsk,
+        shipper_fullname=receipt.shipper_fullname,
+        is_add_container=receipt.add_container,
+        shipper=receipt.shipper,
+        shipper_phone=receipt.shipper_phone,
+        consignee=receipt.consignee,
+        consignee_phone=receipt.consignee_phone,
+        product=receipt.product,
+        customer=receipt.customer,
+        container=receipt.container,
+        comment=receipt.comment,
+    )
+
+
+def _new_city(name: str) -> CityORM:
+    return CityORM(name=name, partner_name="", partner_address="", partner_phone="", is_paid_entry=False)
+
+
+async def add_receipt(receipt: SReceiptAdd, session: AsyncSession) -> ReceiptORM:
+    city: CityORM = await city_cache.get_if_exist(_new_city(receipt.city), session)
+    forwarder: ForwarderORM = await forwarder_cache.get_if_exist(ForwarderORM(com_name=receipt.forwarder), session)
+    special_options = await special_option_cache.get_if_exist_many(
+        (SpecialOptionORM(name=option, ordered=None) for option in receipt.special_options),
+        session
+    )
+
+    session.add(new_receipt := ReceiptORM(
+        **_receipt_values(receipt),
+
+        forwarder_r=forwarder,
+        city_r=city,
+        special_options_r=list(special_options.values())
+    ))
+
+    await session.flush()
+    return new_receipt
+
+
+BULK_BATCH_SIZE = 1000
+
+
+async def _insert_receipts(batch: list[tuple[int, SReceiptAdd]], special_option_ids: dict[str, int],
+                           errors: list[SBulkRowError], session: AsyncSession) -> list[int]:
+    try:
+        async with session.begin_nested():
+            result = await session.scalars(
+                insert(ReceiptORM).returning(ReceiptORM.id, sort_by_parameter_order=True),
+                [_receipt_values(receipt) | dict(city=receipt.city, forwarder=receipt.forwarder) for _, receipt in batch]
+            )
+            ids = result.all()
+
+            links = [
+                dict(left_id=receipt_id, right_id=special_option_ids[option])
+                for receipt_id, (_, receipt) in zip(ids, batch) for option in set(receipt.special_options)
+            ]
+            if links:
+                await session.execute(insert(SpecialOptionReceiptORM), links)
+            return ids
+
+    except DBAPIError as e:
+        if len(batch) == 1:
+            errors.append(SBulkRowError(row=batch[0][0], detail=str(e.orig)))
+            return []
+
+    # a failed batch is split in halves until the failing rows are isolated, the rest are still inserted
+    middle = len(batch) // 2
+    return [
+        *await _insert_receipts(batch[:middle], special_option_ids, errors, session),
+        *await _insert_receipts(batch[middle:], special_option_ids, errors, session)
+    ]
+
+
+async def add_receipts(receipts: list[tuple[int, SReceiptAdd]], errors: list[SBulkRowError],
+                       session: AsyncSession) -> SBulkAddResult:
+    new_ids = []
+    # at most one SELECT per dimension table for all distinct keys of the manifest
+    await city_cache.get_if_exist_many((_new_city(receipt.city) for _, receipt in receipts), session)
+    await forwarder_cache.get_if_exist_many(
+        (ForwarderORM(com_name=receipt.forwarder) for _, receipt in receipts),
+        session
+    )
+    special_options = await special_option_cache.get_if_exist_many(
+        (SpecialOptionORM(name=option, ordered=None) for _, receipt in receipts for option in receipt.special_options),
+        session
+    )
+    await session.flush()
+    special_option_ids = {name: option.id for name, option in special_options.items()}
+
+    for i in range(0, len(receipts), BULK_BATCH_SIZE):
+        new_ids.extend(await _insert_receipts(receipts[i:i + BULK_BATCH_SIZE], special_option_ids, errors, session))
+
+    errors.sort(key=lambda error: error.row)
+    return SBulkAddResult(ok=not errors, new_ids=new_ids, errors=errors)
+
+
+# statuses a receipt may move to, by the statuses it may come from
+STATUS_TRANSITIONS = {
+    StatusEnum.shipped: (StatusEnum.in_stock,),
+    StatusEnum.refund: (StatusEnum.in_stock,),
+    StatusEnum.in_stock: (StatusEnum.shipped, StatusEnum.refund),
+}
+
+
+async def edit_receipts_status(edited: SReceiptStatusEdit, session: AsyncSession) -> SBulkUpdateResult:
+    try:
+        status = StatusEnum[edited.status]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown receipt status {edited.status!r}")
+
+    if edited.ids is None and not edited.filters:
+        raise HTTPException(status_code=400, detail="Either ids or filters are required")
+
+    matched = receipt_filters(edited.filters)
+    if edited.ids is not None:
+        matched.append(ReceiptORM.id.in_(edited.ids))
+
+    values = {'status': status, 'updated_at': func.now()}
+    if edited.carriage_number is not None:
+        values['carriage_number'] = edited.carriage_number
+    if edited.date_of_load is not None:
+        values['date_of_load'] = edited.date_of_load
+
+    # receipts whose current status can't move to the new one are left as they are and counted as rejected
+    updated = (
+        update(ReceiptORM)
+        .filter(*matched, ReceiptORM.status.in_(STATUS_TRANSITIONS[status]))
+        .values(values)
+        .returning(ReceiptORM.id)
+        .cte()
+    )
+    stmt = select(
+        select(func.array_agg(updated.c.id)).scalar_subquery(),
+        select(func.count()).select_from(ReceiptORM).filter(*matched).scalar_subquery(),
+    )
+
+    updated_ids, matched_count = (await session.execute(stmt)).one()
+    mark_written(session, ReceiptORM)
+
+    updated_ids = sorted(updated_ids or [])
+    return SBulkUpdateResult(
+        updated_ids=updated_ids,
+        matched=matched_count,
+        rejected=matched_count - len(updated_ids)
+    )
+
+
+async def get_receipt_row(receipt_id: int, session: AsyncSession) -> dict[str, Any]:
+    _, rows, _ = await query_receipts(SGetQuery(count=SGetQueryCount.none, filters=[
+        SGetQueryFilter(attr="id", operation=SGetQueryOperation.equality, target=receipt_id)
+    ]), session)
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+
+    else:
+        return rows[0]
+
+
+async def get_receipt_updated(receipt_id: int, session: AsyncSession) -> datetime.datetime:
+    updated = await session.scalar(select(ReceiptORM.updated_at).filter(ReceiptORM.id == receipt_id))
+    if updated is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    return updated
+
+
+RECEIPT_EDIT_COLUMNS = {
+    'add_container': 'is_add_container',
+    'forwarder_com_name': 'forwarder',
+}
+
+
+async def _edit_failed(receipt_id: int, session: AsyncSession) -> NoReturn:
+    await session.rollback()
+    exists = await session.scalar(select(ReceiptORM.id).filter(ReceiptORM.id == receipt_id))
+    if exists is None:
+        raise HTTPException(status_code=404, detail=f"Receipt with id={receipt_id} not found")
+    raise HTTPException(status_code=412, detail=f"Receipt with id={receipt_id} was changed by someone else")
+
+
+async def edit_receipt(receipt_id: int, edited: SReceiptEdit, expected_updated: datetime.datetime | None,
+                       session: AsyncSession) -> SReceipt:
+    values = {
+        RECEIPT_EDIT_COLUMNS.get(field, field): value for field, value in edited.model_dump().items()
+        if value is not None and field != 'special_options'
+    }
+    # set even when only special options change, so the receipt always gets a new version
+    values['updated_at'] = func.now()
+
+    if edited.status is not None:
+        try:
+            values['status'] = StatusEnum[edited.status]
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown receipt status {edited.status!r}")
+
+    conditions = [ReceiptORM.id == receipt_id]
+    if expected_updated is not None:
+        conditions.append(ReceiptORM.updated_at == expected_updated)
+
+    if edited.city is not None:
+        await city_cache.get_if_exist(_new_city(edited.city), session)
+
+    if edited.forwarder_com_name is not None:
+        await forwarder_cache.get_if_exist(ForwarderORM(com_name=edited.forwarder_com_name), session)
+
+    # links go first, the statement below reads them back. The receipt is locked and checked before,
+    # links to a missing receipt would fail on the foreign key instead of answering 404
+    if edited.special_options is not None:
+        if await session.scalar(select(ReceiptORM.id).filter(*conditions).with_for_update()) is None:
+            await _edit_failed(receipt_id, session)
+
+        special_options = await special_option_cache.get_if_exist_many(
+            (SpecialOptionORM(name=option, ordered=None) for option in edited.special_options),
+            session
+        )
+        await session.execute(
+            delete(SpecialOptionReceiptORM).filter(SpecialOptionReceiptORM.c.left_id == receipt_id)
+        )
+        if special_options:
+            await session.execute(insert(SpecialOptionReceiptORM), [
+                dict(left_id=receipt_id, right_id=option.id) for option in special_options.values()
+            ])
+
+    updated = update(ReceiptORM).filter(*conditions).values(values).returning(*ReceiptORM.__table__.c).cte()
+    result = await session.execute(receipt_select(RECEIPT_FIELDS, receipt=aliased(ReceiptORM, updated)))
+    mark_written(session, ReceiptORM)
+
+    if (row := result.first()) is None:
+        await _edit_failed(receipt_id, session)
+
+    return SReceipt.model_construct(**receipt_mapping_rows([row])[0])
+
+
+async def get_document_receipts(query: SGetDocumentsQuery, session: AsyncSession) -> list[SReceipt]:
+    limit = settings.PDF_MERGE_LIMIT if query.format == SGetQueryDocumentFormat.pdf else settings.PDF_BATCH_LIMIT
+    stmt = (
+        receipt_select(RECEIPT_FIELDS)
+        .filter(*receipt_filters(query.filters))
+        .order_by(*(get_sqlalchemy_order(ReceiptORM, q_order) for q_order in get_cursor_orders(query.orders)))
+        .limit(limit + 1)
+    )
+    result = await session.execute(stmt)
+    receipts = [SReceipt.model_construct(**row) for row in receipt_mapping_rows(result.all())]
+
+    if len(receipts) > limit:
+        raise HTTPException(
+            status_code=400,
+            detail=f"More than {limit} receipts match the filters, narrow them down"
+        )
+    return receipts
@@ -0,0 +1,65 @@
+from fastapi import HTTPException
+from sqlalchemy import select, insert, delete, func, text, cast, BIGINT, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import ReceiptORM, ReceiptSummaryORM
+from app.schemas import SGetSummaryQuery, SSummary, get_sqlalchemy_filter
+
+SUMMARY_GROUPS = ('city', 'forwarder', 'status', 'date_of_load')
+SUMMARY_TOTALS = ('receipt_count', 'place_count', 'weight', 'volume', 'price')
+
+
+async def get_summary(query: SGetSummaryQuery, session: AsyncSession) -> list[SSummary]:
+    groups = [getattr(ReceiptSummaryORM, group.value) for group in query.group_by]
+    try:
+        filters = [get_sqlalchemy_filter(ReceiptSummaryORM, q_filter) for q_filter in query.filters]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stmt = (
+        select(
+            *groups,
+            *(
+                func.coalesce(cast(func.sum(getattr(ReceiptSummaryORM, total)), BIGINT), 0).label(total)
+                for total in ('receipt_count', 'place_count', 'weight')
+            ),
+            *(
+                func.coalesce(cast(func.sum(getattr(ReceiptSummaryORM, total)), Float), 0).label(total)
+                for total in ('volume', 'price')
+            ),
+        )
+        .filter(*filters)
+        .group_by(*groups)
+        .order_by(*groups)
+    )
+    result = await session.execute(stmt)
+
+    summaries = []
+    for row in result.mappings():
+        row = dict(row)
+        if 'status' in row:
+            row['status'] = str(row['status'].value)
+        summaries.append(SSummary(**row))
+    return summaries
+
+
+async def rebuild_summary(session: AsyncSession) -> int:
+    # receipt writes wait until the rebuild commits, so no trigger delta is lost or counted twice
+    await session.execute(text('LOCK TABLE "ReceiptORM" IN SHARE MODE'))
+    await session.execute(delete(ReceiptSummaryORM))
+
+    groups = [getattr(ReceiptORM, group) for group in SUMMARY_GROUPS]
+    await session.execute(
+        insert(ReceiptSummaryORM).from_select(
+            [*SUMMARY_GROUPS, *SUMMARY_TOTALS],
+            select(
+                *groups,
+                func.count(),
+                func.sum(ReceiptORM.place_count),
+                func.sum(ReceiptORM.weight),
+                func.sum(ReceiptORM.volume),
+                func.sum(ReceiptORM.price),
+            ).group_by(*groups)
+        )
+    )
+    return await session.scalar(select(func.count()).select_from(ReceiptSummaryORM))
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+
+from app.routers.conditional import etag_matches, datetime_etag, parse_etag_datetime, http_date, parse_http_date, \
+    validator_headers, not_modified, parse_if_match
+
+UPDATED = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    (None, False),
+    ('"a"', True),
+    ('W/"a"', True),
+    ('"b", "a"', True),
+    ('*', True),
+    ('"b"', False),
+])
+def test_etag_matches(if_none_match: str | None, matches: bool):
+    assert etag_matches(if_none_match, '"a"') is matches
+
+
+@pytest.mark.parametrize('value', [datetime_etag(UPDATED), 'W/' + datetime_etag(UPDATED), UPDATED.isoformat()])
+def test_parse_etag_datetime(value: str):
+    assert parse_etag_datetime(value) == UPDATED
+
+
+def test_parse_etag_datetime_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_etag_datetime('"v1"')
+
+
+@pytest.mark.parametrize('if_match, expected', [('*', None), (' * ', None), (datetime_etag(UPDATED), UPDATED)])
+def test_parse_if_match(if_match: str, expected: datetime.datetime | None):
+    assert parse_if_match(if_match) == expected
+
+
+def test_parse_if_match_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_if_match('"*"')
+
+
+def test_http_date_reads_naive_as_utc():
+    assert http_date(UPDATED) == 'Wed, 01 May 2024 12:30:15 GMT'
+
+
+def test_http_date_converts_aware():
+    novosibirsk = datetime.timezone(datetime.timedelta(hours=7))
+    assert http_date(datetime.datetime(2024, 5, 1, 19, 30, 15, tzinfo=novosibirsk)) == 'Wed, 01 May 2024 12:30:15 GMT'
+
+
+@pytest.mark.parametrize('value', [
+    'Wed, 01 May 2024 12:30:15 GMT',
+    'Wed, 01 May 2024 19:30:15 +0700',
+    'Wednesday, 01-May-24 12:30:15 GMT',
+    'Wed May  1 12:30:15 2024',
+])
+def test_parse_http_date(value: str):
+    assert parse_http_date(value) == datetime.datetime(2024, 5, 1, 12, 30, 15)
+
+
+def test_validator_headers():
+    assert validator_headers('"a"', UPDATED) == {
+        'ETag': '"a"', 'Last-Modified': 'Wed, 01 May 2024 12:30:15 GMT', 'Cache-Control': 'no-cache'
+    }
+
+
+@pytest.mark.parametrize('if_none_match, if_modified_since, result', [
+    (None, None, False),
+    ('"a"', None, True),
+    ('"b"', None, False),
+    # If-Modified-Since is ignored when If-None-Match is sent
+    ('"b"', 'Wed, 01 May 2024 12:30:15 GMT', False),
+    (None, 'Wed, 01 May 2024 12:30:15 GMT', True),
+    (None, 'Thu, 02 May 2024 00:00:00 GMT', True),
+    (None, 'Wed, 01 May 2024 12:30:14 GMT', False),
+    (None, 'garbage', False),
+])
+def test_not_modified(if_none_match: str | None, if_modified_since: str | None, result: bool):
+    assert not_modified(validator_headers('"a"', UPDATED), if_none_match, if_modified_since) is result
@@ -0,0 +1,80 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import ReceiptORM
+from app.schemas import SGetQuery, SGetQueryOrder, SGetQueryPagination, encode_cursor, decode_cursor, \
+    get_cursor_orders, SGetQueryCount
+from services.receipts import query_receipts
+
+
+def test_cursor_orders_end_with_id():
+    orders = get_cursor_orders([SGetQueryOrder(attr='weight', use_asc=False)])
+    assert [(q_order.attr, q_order.use_asc) for q_order in orders] == [('weight', False), ('id', True)]
+
+    orders = [SGetQueryOrder(attr='id', use_asc=False)]
+    assert get_cursor_orders(orders) == orders
+
+
+def test_cursor_round_trip():
+    orders = get_cursor_orders([SGetQueryOrder(attr='created_at'), SGetQueryOrder(attr='comment')])
+    created = datetime.datetime(2024, 5, 1, 12, 30, 15, 123456)
+    row = SimpleNamespace(created_at=created, comment=None, id=42)
+
+    assert decode_cursor(ReceiptORM, encode_cursor(row, orders), orders) == [created, None, 42]
+
+
+def test_cursor_is_malformed():
+    orders = get_cursor_orders([])
+    for cursor in ('not base64!', 'e30=', 'W10='):
+        with pytest.raises(ValueError, match='Malformed cursor'):
+            decode_cursor(ReceiptORM, cursor, orders)
+
+
+def test_cursor_from_other_orders():
+    cursor = encode_cursor(SimpleNamespace(weight=3, id=1), get_cursor_orders([SGetQueryOrder(attr='weight')]))
+    with pytest.raises(ValueError, match='does not match'):
+        decode_cursor(ReceiptORM, cursor, get_cursor_orders([SGetQueryOrder(attr='weight', use_asc=False)]))
+
+
+@pytest.mark.parametrize('query', [
+    SGetQuery(pagination=SGetQueryPagination.cursor, limit=0),
+    SGetQuery(limit=-1),
+    SGetQuery(offset=-5),
+])
+def test_query_rejects_bad_paging(query: SGetQuery):
+    # rejected before the session is used
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(query_receipts(query, None))
+    assert e.value.status_code == 400
+
+
+class StubSession:
+    # answers the page statement with no rows and any count with the total
+    def __init__(self, total: int):
+        self.total = total
+        self.statements = []
+
+    async def execute(self, stmt, params=None):
+        self.statements.append(stmt)
+        rows = [] if len(self.statements) == 1 else [(self.total,)]
+        return SimpleNamespace(all=lambda: rows, scalars=lambda: SimpleNamespace(one=lambda: self.total))
+
+
+@pytest.mark.parametrize('query', [
+    SGetQuery(count=SGetQueryCount.exact, limit=0),
+    SGetQuery(count=SGetQueryCount.exact, offset=100),
+])
+def test_empty_page_still_counts(query: SGetQuery):
+    session = StubSession(total=7)
+    assert asyncio.run(query_receipts(query, session)) == (7, [], None)
+    assert len(session.statements) == 2
+
+
+def test_empty_first_page_counts_nothing():
+    session = StubSession(total=7)
+    assert asyncio.run(query_receipts(SGetQuery(count=SGetQueryCount.exact), session)) == (0, [], None)
+    assert len(session.statements) == 1
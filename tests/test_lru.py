@@ -0,0 +1,53 @@
+import time
+
+from app.cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_set_refreshes_recency():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.set('a', 10)
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b')) == (10, None)
+
+
+def test_falsy_values_are_cached():
+    cache = LRUCache(maxsize=2)
+    cache.set('zero', 0)
+    assert cache.get('zero', 'missing') == 0
+
+
+def test_expires_after_ttl(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 9)
+    assert cache.get('a') == 1
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert cache.get('a', 'expired') == 'expired'
+    assert len(cache) == 0
+
+
+def test_pop_and_clear():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.pop('a') == 1
+    assert cache.pop('a', 'missing') == 'missing'
+    cache.clear()
+    assert len(cache) == 0
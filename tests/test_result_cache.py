@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from app.cache import LocalResultCacheBackend, QueryResultCache, result_cache, table_versions, mark_written
+from app.database import ReceiptORM, core, get_session
+from app.schemas import SGetQuery, SGetQueryFilter, SGetQueryOrder, SGetQueryOperation, get_query_key
+
+TABLES = (ReceiptORM.__tablename__,)
+
+
+def _filter(attr: str, target) -> SGetQueryFilter:
+    return SGetQueryFilter(attr=attr, operation=SGetQueryOperation.equality, target=target)
+
+
+def test_query_key_ignores_filter_and_field_order():
+    query = SGetQuery(filters=[_filter('city', 'NSK'), _filter('weight', 3)], fields=['id', 'city'])
+    same = SGetQuery(filters=[_filter('weight', 3), _filter('city', 'NSK')], fields=['city', 'id', 'id'])
+    assert get_query_key(query) == get_query_key(same)
+
+
+@pytest.mark.parametrize('other', [
+    SGetQuery(filters=[_filter('city', 'MSK')]),
+    SGetQuery(filters=[_filter('city', 'NSK')], limit=2),
+    SGetQuery(filters=[_filter('city', 'NSK')], offset=1),
+    SGetQuery(filters=[_filter('city', 'NSK')], fields=['id']),
+    SGetQuery(filters=[_filter('city', 'NSK')], orders=[SGetQueryOrder(attr='id', use_asc=False)]),
+])
+def test_query_key_tells_pages_apart(other: SGetQuery):
+    assert get_query_key(SGetQuery(filters=[_filter('city', 'NSK')])) != get_query_key(other)
+
+
+def test_query_key_keeps_order_of_orders():
+    orders = [SGetQueryOrder(attr='weight'), SGetQueryOrder(attr='id')]
+    assert get_query_key(SGetQuery(orders=orders)) != get_query_key(SGetQuery(orders=orders[::-1]))
+
+
+def test_local_backend_evicts_by_size():
+    async def run():
+        backend = LocalResultCacheBackend(memory_size=100)
+        await backend.set('a', b'a' * 60, 60)
+        await backend.set('b', b'b' * 30, 60)
+        assert await backend.get('a') is not None
+        await backend.set('c', b'c' * 30, 60)
+        # larger than the whole budget, never stored
+        await backend.set('d', b'd' * 101, 60)
+
+        assert (await backend.get('b'), await backend.get('d')) == (None, None)
+        assert (await backend.get('a'), await backend.get('c')) == (b'a' * 60, b'c' * 30)
+        assert len(backend) == 2
+
+    asyncio.run(run())
+
+
+def test_local_backend_expires(monkeypatch):
+    async def run():
+        now = time.monotonic()
+        monkeypatch.setattr(time, 'monotonic', lambda: now)
+        backend = LocalResultCacheBackend(memory_size=100)
+        await backend.set('a', b'a', 10)
+
+        monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+        assert await backend.get('a') is None
+        assert len(backend) == 0
+
+    asyncio.run(run())
+
+
+def test_write_moves_key():
+    async def run():
+        cache = QueryResultCache(LocalResultCacheBackend(memory_size=100), ttl=60)
+        key = await cache.key('receipts', 'query', TABLES)
+        await cache.set(key, b'page')
+        assert await cache.key('receipts', 'query', TABLES) == key
+        assert await cache.get(key) == b'page'
+
+        table_versions.bump(ReceiptORM)
+        key = await cache.key('receipts', 'query', TABLES)
+        assert await cache.get(key) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    asyncio.run(run())
+
+
+class RecordingBackend(LocalResultCacheBackend):
+    def __init__(self):
+        super().__init__(memory_size=100)
+        self.bumped = []
+
+    async def bump(self, tables):
+        self.bumped.append(set(tables))
+
+
+@pytest.fixture
+def backend(monkeypatch) -> RecordingBackend:
+    engine = create_async_engine('sqlite+aiosqlite://')
+    monkeypatch.setattr(core, 'AsyncSessionM', async_sessionmaker(engine, expire_on_commit=False))
+    backend = RecordingBackend()
+    monkeypatch.setattr(result_cache, 'backend', backend)
+    yield backend
+    asyncio.run(engine.dispose())
+
+
+async def _request(fail: bool = False):
+    sessions = get_session()
+    session = await anext(sessions)
+    await session.execute(text('SELECT 1'))
+    mark_written(session.sync_session, ReceiptORM)
+    if fail:
+        with pytest.raises(RuntimeError):
+            await sessions.athrow(RuntimeError())
+    else:
+        with pytest.raises(StopAsyncIteration):
+            await anext(sessions)
+
+
+def test_commit_publishes_written_tables(backend: RecordingBackend):
+    asyncio.run(_request())
+    assert backend.bumped == [{ReceiptORM.__tablename__}]
+
+
+def test_rollback_publishes_nothing(backend: RecordingBackend):
+    asyncio.run(_request(fail=True))
+    assert backend.bumped == []
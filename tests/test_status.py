@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import StatusEnum
+from app.schemas import SReceiptStatusEdit
+from services.receipts import STATUS_TRANSITIONS, edit_receipts_status
+
+
+def test_every_status_is_reachable():
+    assert set(STATUS_TRANSITIONS) == set(StatusEnum)
+
+
+def test_no_status_moves_to_itself():
+    for status, sources in STATUS_TRANSITIONS.items():
+        assert status not in sources
+
+
+def test_shipped_and_refunded_come_back_to_stock_only():
+    assert STATUS_TRANSITIONS[StatusEnum.shipped] == (StatusEnum.in_stock,)
+    assert STATUS_TRANSITIONS[StatusEnum.refund] == (StatusEnum.in_stock,)
+    assert set(STATUS_TRANSITIONS[StatusEnum.in_stock]) == {StatusEnum.shipped, StatusEnum.refund}
+
+
+@pytest.mark.parametrize('edited, detail', [
+    (SReceiptStatusEdit(status='lost', ids=[1]), "Unknown receipt status 'lost'"),
+    (SReceiptStatusEdit(status='shipped'), "Either ids or filters are required"),
+])
+def test_rejected_edits(edited: SReceiptStatusEdit, detail: str):
+    # rejected before the session is used
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(edit_receipts_status(edited, None))
+    assert (e.value.status_code, e.value.detail) == (400, detail)
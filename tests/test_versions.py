@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, DeclarativeBase, Mapped, mapped_column
+
+from app.cache import table_versions, mark_written
+
+
+class VersionsBase(DeclarativeBase):
+    pass
+
+
+class VersionedORM(VersionsBase):
+    __tablename__ = 'versioned'
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+
+class OtherORM(VersionsBase):
+    __tablename__ = 'versioned_other'
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    VersionsBase.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def test_commit_bumps_written_tables(session: Session):
+    before = table_versions.get(VersionedORM, OtherORM)
+    session.add(VersionedORM(id=1))
+    session.flush()
+    assert table_versions.get(VersionedORM, OtherORM) == before
+
+    session.commit()
+    assert table_versions.get(VersionedORM, OtherORM) == (before[0] + 1, before[1])
+
+
+def test_rollback_bumps_nothing(session: Session):
+    before = table_versions.get(VersionedORM)
+    session.add(VersionedORM(id=1))
+    session.flush()
+    session.rollback()
+    session.commit()
+    assert table_versions.get(VersionedORM) == before
+
+
+def test_released_savepoint_waits_for_commit(session: Session):
+    before = table_versions.get(VersionedORM)
+    with session.begin_nested():
+        session.add(VersionedORM(id=1))
+    assert table_versions.get(VersionedORM) == before
+
+    session.commit()
+    assert table_versions.get(VersionedORM) == (before[0] + 1,)
+
+
+def test_rolled_back_savepoint_keeps_earlier_writes(session: Session):
+    before = table_versions.get(VersionedORM, OtherORM)
+    session.add(VersionedORM(id=1))
+    session.flush()
+
+    savepoint = session.begin_nested()
+    session.add(OtherORM(id=1))
+    session.flush()
+    savepoint.rollback()
+
+    session.commit()
+    # the savepoint's own write is still counted, invalidating too much is harmless
+    assert table_versions.get(VersionedORM, OtherORM) == (before[0] + 1, before[1] + 1)
+
+
+def test_mark_written(session: Session):
+    before = table_versions.get(OtherORM)
+    mark_written(session, OtherORM)
+    session.commit()
+    assert table_versions.get(OtherORM) == (before[0] + 1,)